@@ -0,0 +1,165 @@
+"""Benchmarks the Clarke and Wright algorithm on seeded random problems and compares the results with a baseline.
+
+A case is a number of clients, a version ("sequential" or "parallel"), a cost function (cost_a or cost_b) and a wind
+(no wind or a steady wind). Every case is solved repeat times with profiling enabled (see Profiling): the best time of
+every phase and of the whole solve is kept. It is then solved once more under tracemalloc, to measure the peak memory
+without slowing down the timed runs. The cost of the solution is recorded too, so that the comparison with a baseline
+catches quality regressions as well as speed and memory regressions.
+Above dense_limit clients, the savings are only computed between nearest neighbours (k_nearest, see
+CostFunction.sparse_savings_pairs): a dense cost matrix of 20000 clients alone needs 3.2 GB.
+
+Usage:
+    python Benchmark.py --output results.json
+    python Benchmark.py --sizes 50 1000 --baseline baseline.json --output results.json
+The exit code is 1 if a regression was found with respect to the baseline.
+"""
+import argparse
+import itertools
+import json
+import platform
+import sys
+import time
+import tracemalloc
+import numpy as np
+import Drone as dro
+import CostFunction as cost
+
+SIZES = (50, 200, 1000, 5000, 20000)
+VERSIONS = ("sequential", "parallel")
+COST_FUNCTIONS = {"cost_a": cost.cost_a, "cost_b": cost.cost_b}
+WINDS = {"calm": (0., 0.), "wind": (3., 2.)}
+
+
+def make_cases(sizes=SIZES, versions=VERSIONS, cost_functions=tuple(COST_FUNCTIONS), winds=tuple(WINDS),
+               dense_limit=5000, k_nearest=30):
+    """Returns the list of the cases (dictionaries) of every combination of sizes, versions, cost functions (names of
+    COST_FUNCTIONS) and winds (names of WINDS)."""
+    cases = []
+    for size, version, cost_function, wind in itertools.product(sizes, versions, cost_functions, winds):
+        cases.append({"name": "{}-{}-{}-{}".format(version, cost_function, wind, size), "size": size,
+                      "version": version, "cost_function": cost_function, "wind": wind,
+                      "k_nearest": k_nearest if size > dense_limit else None})
+    return cases
+
+
+def make_problem(size, seed=0):
+    """Returns the random problem of size clients used by the cases, the same for a given seed."""
+    problem = dro.Problem(dro.Depot("depot", 0., 0.))
+    problem.generate_random_clients(size, rng=np.random.default_rng([seed, size]))
+    return problem
+
+
+def run_case(case, seed=0, repeat=3, drone=None):
+    """Solves case (see make_cases) and returns its result: a copy of the case with the best time of the solve
+    ("time") and of its phases ("phases"), the peak memory in bytes ("peak_memory"), the counters of the profiler,
+    and the cost, savings and number of deliveries of the solution."""
+    if drone is None:
+        drone = dro.Drone(500, 10, 0.01)
+    problem = make_problem(case["size"], seed)
+    parameters = dro.DeliveryParameters(drone, dro.Wind(*WINDS[case["wind"]]), COST_FUNCTIONS[case["cost_function"]])
+
+    def solve():
+        solution = cost.clarke_and_wright(problem, parameters, case["version"], verbose=False,
+                                          k_nearest=case["k_nearest"], profile=True)
+        problem.solutions_list.clear()
+        return solution
+
+    best_time, phases, solution = float("inf"), dict(), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        solution = solve()
+        best_time = min(best_time, time.perf_counter() - start)
+        for phase, values in solution.profile_report["phases"].items():
+            phases[phase] = min(phases.get(phase, float("inf")), values["time"])
+    tracemalloc.start()
+    try:
+        solve()
+        _, peak_memory = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    solution_cost, savings = solution.cost_and_savings()
+    return dict(case, time=best_time, phases=phases, peak_memory=peak_memory,
+                counters=solution.profile_report["counters"], cost=float(solution_cost), savings=float(savings),
+                deliveries=len(solution.deliveries_list))
+
+
+def run_benchmark(cases, seed=0, repeat=3, progress=None):
+    """Runs the cases and returns a dictionary: the environment (versions of python and numpy, machine), the seed
+    and the results of the cases (see run_case). progress is an optional function called with each result."""
+    results = []
+    for case in cases:
+        result = run_case(case, seed, repeat)
+        if progress is not None:
+            progress(result)
+        results.append(result)
+    return {"environment": {"python": platform.python_version(), "numpy": np.__version__,
+                            "machine": platform.machine(), "processor": platform.processor()},
+            "seed": seed, "repeat": repeat, "results": results}
+
+
+def compare(benchmark, baseline, time_tolerance=0.25, memory_tolerance=0.25, cost_tolerance=1e-9, time_slack=0.005):
+    """Compares the results of two benchmarks (see run_benchmark) case by case (cases are matched by name, the others
+    are ignored). Returns the list of the regressions, as dictionaries (case name, field, baseline value, value):
+    - time or a phase time greater than the baseline by more than time_tolerance (relative) and time_slack seconds,
+    - peak memory greater than the baseline by more than memory_tolerance (relative),
+    - cost greater than the baseline by more than cost_tolerance (relative). The problems are seeded, so a change of
+    cost is a change of the solution."""
+    baseline_results = {result["name"]: result for result in baseline["results"]}
+    regressions = []
+    for result in benchmark["results"]:
+        reference = baseline_results.get(result["name"])
+        if reference is None:
+            continue
+        times = [("time", reference["time"], result["time"])]
+        times.extend(("phases." + phase, reference["phases"][phase], value)
+                     for phase, value in result["phases"].items() if phase in reference["phases"])
+        checks = [(field, old, new, old * (1 + time_tolerance) + time_slack) for field, old, new in times]
+        checks.append(("peak_memory", reference["peak_memory"], result["peak_memory"],
+                       reference["peak_memory"] * (1 + memory_tolerance)))
+        checks.append(("cost", reference["cost"], result["cost"], reference["cost"] * (1 + cost_tolerance)))
+        for field, old, new, limit in checks:
+            if new > limit:
+                regressions.append({"name": result["name"], "field": field, "baseline": old, "value": new})
+    return regressions
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description="Benchmarks the Clarke and Wright algorithm.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES)
+    parser.add_argument("--versions", nargs="+", default=VERSIONS, choices=VERSIONS)
+    parser.add_argument("--cost-functions", nargs="+", default=tuple(COST_FUNCTIONS), choices=tuple(COST_FUNCTIONS))
+    parser.add_argument("--winds", nargs="+", default=tuple(WINDS), choices=tuple(WINDS))
+    parser.add_argument("--dense-limit", type=int, default=5000)
+    parser.add_argument("--k-nearest", type=int, default=30)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--output", help="file where the results are written (JSON)")
+    parser.add_argument("--baseline", help="results of a previous run (JSON) to compare with")
+    parser.add_argument("--time-tolerance", type=float, default=0.25)
+    parser.add_argument("--memory-tolerance", type=float, default=0.25)
+    arguments = parser.parse_args(arguments)
+
+    cases = make_cases(arguments.sizes, arguments.versions, arguments.cost_functions, arguments.winds,
+                       arguments.dense_limit, arguments.k_nearest)
+
+    def progress(result):
+        print("{:<32} {:>9.4f} s {:>12} B cost = {:.6g}".format(result["name"], result["time"],
+                                                                 result["peak_memory"], result["cost"]))
+
+    benchmark = run_benchmark(cases, arguments.seed, arguments.repeat, progress)
+    if arguments.output:
+        with open(arguments.output, "w") as f:
+            json.dump(benchmark, f, indent=1)
+    if arguments.baseline:
+        with open(arguments.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(benchmark, baseline, arguments.time_tolerance, arguments.memory_tolerance)
+        for regression in regressions:
+            print("Regression: {name} {field}: {baseline:.6g} -> {value:.6g}".format(**regression))
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
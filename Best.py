@@ -1,5 +1,6 @@
 import CostFunction as pro
 import Drone as pre
+import MonteCarlo as mc
 import Visualize as post
 import matplotlib.pyplot as plt
 import numpy as np
@@ -13,19 +14,10 @@ wind1 = pre.Wind(np.random.uniform(2.0, 3.5), 0)
 
 depot1 = pre.Depot("Chatenay-Malabry", 0, 0)
 
-param1 = pre.DeliveryParameters(drone1, wind1, pro.cost_b)
-
-total_cost = 0
-total_savings = 0
-for i in range(500):
-    print(i)
-    problem_i = pre.Problem(depot1)
-    problem_i.generate_random_clients(amount=np.random.randint(50, 60),
-                                      x=(-6000, 6000), y=(-3500, 3500),
-                                      demand=(5, 60))
-    pro.clarke_and_wright(problem_i, param1, version="sequential")
-    solution_i = problem_i.solutions_list[0]
-    total_cost += solution_i.cost_and_savings()[0]
-    total_savings += solution_i.cost_and_savings()[1]
-average = total_savings / (total_savings + total_cost)
-print("Drone1.", "La moyenne d'économie en séquentielle pour 1000 problèmes indépendants est {}".format(average))
\ No newline at end of file
+if __name__ == "__main__":  # the problems are solved by a pool of processes
+    results, summary = mc.run_experiments(500, [drone1], [wind1], pro.cost_b, version="sequential", depot=depot1,
+                                          amount=(50, 60), x=(-6000, 6000), y=(-3500, 3500), demand=(5, 60),
+                                          progress=lambda result: print(result["index"]))
+    average = summary[0]["average_savings_ratio"]
+    print("Drone1.",
+          "La moyenne d'économie en séquentielle pour 1000 problèmes indépendants est {}".format(average))
@@ -1,18 +1,32 @@
+import collections
 import numpy as np
 import Drone as dro
+import Profiling as prof
+import SpatialIndex as spi
 
 def drone_power_consumption(drone, speed_rel_to_air, rho=1.3):
     # Calculate power consumption 
     # power = 1/2 * rho * A * Cd * speed^3
     # drone: instance of class Drone
-    # speed_rel_to_air: float value (m.s-1)
+    # speed_rel_to_air: float value (m.s-1), or numpy array of speeds (the power is then computed element-wise)
     # rho: air density (kg/m3)
     power = 1/2 * rho * drone.acd * speed_rel_to_air ** 3
     return power
 
+
+def batch_drone_power_consumption(drone, speeds_rel_to_air, rho=1.3):
+    """Vectorized version of drone_power_consumption. speeds_rel_to_air is an array-like of speeds (m.s-1) and the
+    function returns a numpy array of powers with the same shape."""
+    return drone_power_consumption(drone, np.asarray(speeds_rel_to_air, dtype=float), rho)
+
+
 def cost_a(point_a, point_b, drone, wind):
     # Cost calculated by constant speed relative to the GROUND
     assert drone.speed > 0
+    if isinstance(wind, dro.WindField):
+        return float(batch_cost_a(point_a.x, point_a.y, point_b.x, point_b.y, drone, wind))
+    if prof.current is not None:
+        prof.current.count("cost_evaluations")
     vector_displacement  = np.array((point_b.x - point_a.x, point_b.y - point_a.y ))
     distance  = np.linalg.norm(vector_displacement)
     if distance>0:
@@ -36,15 +50,20 @@ def cost_b(point_a, point_b, drone, wind, safety_factor=2):
 
     # pre.place_holder(point_a, point_b, drone, wind)
     assert safety_factor > 1 
+    if isinstance(wind, dro.WindField):
+        return float(batch_cost_b(point_a.x, point_a.y, point_b.x, point_b.y, drone, wind, safety_factor))
 
-    assert drone.speed > safety_factor*wind.speed
+    if prof.current is not None:
+        prof.current.count("cost_evaluations")
+    wind_speed = wind.speed  # computed once, it is needed by the assertion and by the formula
+    assert drone.speed > safety_factor*wind_speed
 
     vector_deplacement = np.array((point_b.x - point_a.x, point_b.y - point_a.y))
     distance = np.linalg.norm(vector_deplacement)
     if distance > 0:
         vector_deplacement_norm = vector_deplacement / distance
         e = (wind.x * vector_deplacement_norm[0] + wind.y * vector_deplacement_norm[1])
-        f = wind.speed**2 - drone.speed**2
+        f = wind_speed**2 - drone.speed**2
         delta = 4*e**2 - 4*f
         v3 = e + (0.5 * np.sqrt(delta))
         
@@ -52,6 +71,104 @@ def cost_b(point_a, point_b, drone, wind, safety_factor=2):
     else:
         return 0
 
+
+def _unit_displacements(dx, dy):
+    """Returns (distance, ux, uy) for arrays of displacements. (ux, uy) is the unit vector of the displacement, it is
+    set to (0, 0) where the distance is 0 so that no division by zero occurs."""
+    distance = np.hypot(dx, dy)
+    safe_distance = np.where(distance > 0, distance, 1.)
+    return distance, np.where(distance > 0, dx / safe_distance, 0.), np.where(distance > 0, dy / safe_distance, 0.)
+
+
+def _cost_a_kernel(dx, dy, drone, wind_x, wind_y):
+    """Broadcast kernel of cost_a. dx, dy, wind_x and wind_y are arrays (or floats) that must be broadcastable
+    together. Returns the cost of every displacement (dx, dy) flown under the wind (wind_x, wind_y)."""
+    distance, ux, uy = _unit_displacements(dx, dy)
+    norm_speed_relative = np.hypot(drone.speed * ux - wind_x, drone.speed * uy - wind_y)
+    cost = drone_power_consumption(drone, norm_speed_relative, rho=1.3) * distance / drone.speed
+    return np.where(distance > 0, cost, 0.)
+
+
+def _cost_b_kernel(dx, dy, drone, wind_x, wind_y):
+    """Broadcast kernel of cost_b (without the safety factor check, see batch_cost_b)."""
+    distance, ux, uy = _unit_displacements(dx, dy)
+    e = wind_x * ux + wind_y * uy
+    f = wind_x**2 + wind_y**2 - drone.speed**2
+    v3 = e + 0.5 * np.sqrt(4*e**2 - 4*f)
+    cost = drone_power_consumption(drone, drone.speed, rho=1.3) * distance / v3
+    return np.where(distance > 0, cost, 0.)
+
+
+_SAMPLES_PER_BLOCK = 2**20  # number of wind samples evaluated at once when legs are integrated in a wind field
+
+
+def integrate_legs(kernel, x_a, y_a, x_b, y_b, drone, wind_field):
+    """Returns the costs of the straight legs from the points a to the points b flown in a wind field (instance of
+    Drone.WindField), for a broadcast kernel (see _cost_a_kernel). Every leg is cut into segments no longer than
+    wind_field.step, each segment being flown in the wind at its middle: the cost of a leg is the sum of the costs of
+    its segments (the number of segments of a leg only depends on its length). The legs are evaluated by blocks, in
+    one broadcast pass per block."""
+    dx, dy = np.subtract(x_b, x_a), np.subtract(y_b, y_a)
+    shape = np.broadcast(x_a, y_a, dx, dy).shape
+    x_a, y_a, dx, dy = [np.broadcast_to(array, shape).ravel() for array in (x_a, y_a, dx, dy)]
+    if np.isfinite(wind_field.step):
+        segments = np.maximum(np.ceil(np.hypot(dx, dy) / wind_field.step), 1.)
+    else:
+        segments = np.ones(dx.size)
+    costs = np.empty(dx.size)
+    order = np.argsort(segments, kind="stable")  # legs with similar numbers of segments are evaluated together
+    start = 0
+    while start < dx.size:
+        samples = int(segments[order[min(start + _SAMPLES_PER_BLOCK, dx.size) - 1]])
+        stop = min(start + max(1, _SAMPLES_PER_BLOCK // samples), dx.size)
+        legs = order[start:stop]
+        samples = int(segments[legs[-1]])
+        n = segments[legs, None]
+        k = np.arange(samples)
+        middles = (k + 0.5) / n  # positions of the middles of the segments along the legs
+        wind_x, wind_y = wind_field.at(x_a[legs, None] + middles * dx[legs, None],
+                                       y_a[legs, None] + middles * dy[legs, None])
+        leg_costs = kernel(dx[legs, None] / n, dy[legs, None] / n, drone, wind_x, wind_y)
+        costs[legs] = np.where(k < n, leg_costs, 0.).sum(axis=1)
+        start = stop
+    return costs.reshape(shape)
+
+
+def batch_cost_a(x_a, y_a, x_b, y_b, drone, wind):
+    """Vectorized version of cost_a. The coordinates of the points a and b are given as numpy arrays that must be
+    broadcastable together, the result has the broadcast shape. For instance, with x and y two 1-dimensional arrays,
+    batch_cost_a(x[:, None], y[:, None], x[None, :], y[None, :], drone, wind) is the full (asymmetric) cost matrix.
+    wind can be a Drone.WindField, the costs are then integrated along the legs (see integrate_legs)."""
+    assert drone.speed > 0
+    if prof.current is not None:
+        prof.current.count("cost_evaluations", np.broadcast(x_a, y_a, x_b, y_b).size)
+    if isinstance(wind, dro.WindField):
+        return integrate_legs(_cost_a_kernel, x_a, y_a, x_b, y_b, drone, wind)
+    return _cost_a_kernel(np.subtract(x_b, x_a), np.subtract(y_b, y_a), drone, wind.x, wind.y)
+
+
+def batch_cost_b(x_a, y_a, x_b, y_b, drone, wind, safety_factor=2):
+    """Vectorized version of cost_b. See batch_cost_a for the shape of the arguments and for wind fields. In a wind
+    field, the drone must go safety_factor times faster than the strongest wind of the field."""
+    assert safety_factor > 1
+    if prof.current is not None:
+        prof.current.count("cost_evaluations", np.broadcast(x_a, y_a, x_b, y_b).size)
+    if isinstance(wind, dro.WindField):
+        assert drone.speed > safety_factor * wind.speed
+        return integrate_legs(_cost_b_kernel, x_a, y_a, x_b, y_b, drone, wind)
+    assert drone.speed > safety_factor * np.hypot(wind.x, wind.y)
+    return _cost_b_kernel(np.subtract(x_b, x_a), np.subtract(y_b, y_a), drone, wind.x, wind.y)
+
+
+# A cost function can provide a batch form through its 'batch' attribute. The matrix builders use it automatically
+# and fall back to one call per pair of points for cost functions that do not provide one.
+cost_a.batch = batch_cost_a
+cost_b.batch = batch_cost_b
+# It can also provide its broadcast kernel, that evaluates legs under many uniform winds at once (see Robustness).
+cost_a.kernel = _cost_a_kernel
+cost_b.kernel = _cost_b_kernel
+
+
 def check_route_compatibility(route_a, route_b):
     """Checks if two routes don't have inherent incompatibilities. """
     # Right now we'll consider that two routes are compatible is they have the same depot. It might change in the
@@ -90,60 +207,86 @@ def merge_routes(route_a, route_b, must_have_common_client=False):
     
     if not check_route_compatibility(route_a, route_b):
         return None
-    if check_route_compatibility(route_a, route_b):
-        list_des_clients = []
-        if must_have_common_client:
-            if len(route_a.clients_list) == 0 or len(route_b.clients_list) == 0:
-                return None
-            if not route_a.clients_list[-1] is route_b.clients_list[0]:
-                return None
-            for i in range(0, len(route_a.clients_list)):
-                list_des_clients.append(route_a.clients_list[i])
-            for k in range(1, len(route_b.clients_list)):
-                list_des_clients.append(route_b.clients_list[k])
-        if not must_have_common_client:
-            if len(route_a.clients_list) != 0 and len(route_b.clients_list) != 0:
-                if route_a.clients_list[-1] is route_b.clients_list[0]:
-                    for i in range(0, len(route_a.clients_list)):
-                        list_des_clients.append(route_a.clients_list[i])
-                    for k in range(1, len(route_b.clients_list)):
-                        list_des_clients.append(route_b.clients_list[k])
-            if not list_des_clients:
-                for client in route_a.clients_list:
-                    list_des_clients.append(client)
-                for client2 in route_b.clients_list:
-                    list_des_clients.append(client2)
-        route_c = pre.Route(list_des_clients, route_a.depot)
-        if route_c.is_legal:
-            return route_c
-        if not route_c.is_legal:
-            return None
+    common_client = len(route_a.clients_list) != 0 and len(route_b.clients_list) != 0 and \
+        route_a.clients_list[-1] is route_b.clients_list[0]
+    if must_have_common_client and not common_client:
+        return None
+    route_c = route_a.merged_with(route_b, common_client)  # demand and set of clients are merged, not recomputed
+    if route_c.is_legal:
+        return route_c
+    return None
+
+
+def merged_cost_and_savings(delivery_a, delivery_b, common_client=False):
+    """Returns the cost and the savings of the delivery obtained by merging delivery_a and delivery_b (see
+    merge_routes), read in constant time from the cost matrix of the deliveries and from their own cost and savings.
+    When the last client l of delivery_a is followed by the first client f of delivery_b, the legs l -> depot and
+    depot -> f are replaced by the leg l -> f. When they are the same client, its two legs to and from the depot
+    disappear, and so does its out-and-back baseline."""
+    cost_a, savings_a = delivery_a.cost_and_savings()
+    cost_b, savings_b = delivery_b.cost_and_savings()
+    if len(delivery_a.clients_list) == 0 or len(delivery_b.clients_list) == 0:
+        return cost_a + cost_b, savings_a + savings_b
+    c_matrix = delivery_a.c_matrix
+    last = delivery_a.route.indices[-1] + 1
+    first = delivery_b.route.indices[0] + 1
+    if common_client:
+        return cost_a + cost_b - c_matrix[last, 0] - c_matrix[0, first], savings_a + savings_b
+    link = c_matrix[last, 0] + c_matrix[0, first] - c_matrix[last, first]
+    return cost_a + cost_b - link, savings_a + savings_b + link
 
 
 def merge_deliveries(delivery_a, delivery_b, must_have_common_client=False):
     """Merges delivery_a and delivery_b into a new delivery where the route is generated using merge_routes rules.
     delivery_a and delivery_b must be compatible.
+    If both deliveries use the same cost matrix, the cost and the savings of the new delivery are updated in constant
+    time (see merged_cost_and_savings).
     Returns the new delivery if legal. Returns None otherwise."""
     # pre.place_holder(delivery_a, delivery_b, must_have_common_client)
+    if prof.current is not None:
+        prof.current.count("merge_attempts")
     if not check_delivery_compatibility(delivery_a, delivery_b):
         return None
-    if check_delivery_compatibility(delivery_a, delivery_b):
-        new_route = merge_routes(delivery_a.route, delivery_b.route, must_have_common_client)
-        if new_route:
-            new_delivery = pre.Delivery(new_route, delivery_a.parameters)
-            if new_delivery.is_legal:
-                return new_delivery
-        else:
-            return None
-
-
+    new_route = merge_routes(delivery_a.route, delivery_b.route, must_have_common_client)
+    if new_route is None:
+        return None
+    new_delivery = dro.Delivery(new_route, delivery_a.parameters, delivery_a.c_matrix)
+    if not new_delivery.is_legal:
+        return None
+    if delivery_a.c_matrix is not None and delivery_a.c_matrix is delivery_b.c_matrix and \
+            new_delivery.uses_cost_matrix and delivery_a.parameters.cost_func:
+        common_client = len(new_route.clients_list) < len(delivery_a.clients_list) + len(delivery_b.clients_list)
+        new_delivery.cache_cost_and_savings(*merged_cost_and_savings(delivery_a, delivery_b, common_client))
+    if prof.current is not None:
+        prof.current.count("merges")
+    return new_delivery
+
+
+def problem_coordinates(problem):
+    """Returns the coordinates of the depot and of the clients of a problem as two 1-dimensional numpy arrays (x, y).
+    Index 0 is the depot and index i + 1 is the i-th client, like in the cost matrix."""
+    x = np.empty(problem.number_of_clients + 1)
+    y = np.empty(problem.number_of_clients + 1)
+    x[0], y[0] = problem.depot.x, problem.depot.y
+    x[1:] = problem.x
+    y[1:] = problem.y
+    return x, y
+
+
+@prof.timed("cost_matrix")
 def cost_matrix(problem, parameters):
     """This function returns the cost matrix of a problem for a given parameter set.
+    If the cost function has a batch form (see batch_cost_a), the whole matrix is computed in one broadcast pass.
+    Otherwise, the cost function is called for every pair of points.
     :param problem: Instance of class Problem
     :param parameters: Instance of class DeliveryParameters
     :return: 2-dimensional numpy array representing the cost matrix"""
     # pre.place_holder(problem, parameters)
     mat_dim = problem.number_of_clients + 1
+    batch_cost_func = getattr(parameters.cost_func, "batch", None)
+    if batch_cost_func is not None:
+        x, y = problem_coordinates(problem)
+        return batch_cost_func(x[:, None], y[:, None], x[None, :], y[None, :], parameters.drone, parameters.wind)
     c_matrix = np.zeros((mat_dim, mat_dim))  # creates a square matrix (2-dimensional numpy array) filled with zeros
     if parameters.cost_func:
         for i in range(0, len(problem.clients_list)):
@@ -161,77 +304,180 @@ def cost_matrix(problem, parameters):
     return c_matrix
 
 
-def savings_matrix(problem, parameters):
+def savings_from_cost_matrix(c_matrix):
+    """This function returns the savings matrix associated with a cost matrix (index 0 of the cost matrix being the
+    depot). The saving of serving client k right after client i is s_ik = c_i0 + c_0k - c_ik. The diagonal is 0.
+    :param c_matrix: 2-dimensional numpy array, result of cost_matrix
+    :return 2-dimensional numpy array representing the savings matrix"""
+    s_matrix = c_matrix[1:, :1] + c_matrix[:1, 1:] - c_matrix[1:, 1:]
+    np.fill_diagonal(s_matrix, 0.)
+    return s_matrix
+
+
+@prof.timed("savings_matrix")
+def savings_matrix(problem, parameters, c_matrix=None):
     """This function returns the savings matrix of a problem for a given parameter set.
     :param problem. Instance of class Problem
     :param parameters. Instance of class DeliveryParameters
+    :param c_matrix. Optional cost matrix of the problem for these parameters. It is computed if not given.
     :return 2-dimensional numpy array representing the savings matrix"""
     # pre.place_holder(problem, parameters)
     mat_dim = problem.number_of_clients
-    c_matrix = cost_matrix(problem, parameters)
-    s_matrix = np.zeros((mat_dim, mat_dim))  # creates a square matrix (2-dimensional numpy array) filled with zeros
-    if parameters.cost_func:
-        for i in range(0, len(problem.clients_list)):
-            for k in range(0, len(problem.clients_list)):
-                if k != i:
-                    a = parameters.cost_func(problem.clients_list[i], problem.depot, parameters.drone, parameters.wind)
-                    b = parameters.cost_func(problem.depot, problem.clients_list[k], parameters.drone, parameters.wind)
-                    s_matrix[i][k] = a + b - c_matrix[i+1][k+1]
-    return s_matrix
-
-
-def clarke_and_wright_init(problem, parameters):
+    if not parameters.cost_func:
+        return np.zeros((mat_dim, mat_dim))
+    if c_matrix is None:
+        c_matrix = cost_matrix(problem, parameters)
+    return savings_from_cost_matrix(c_matrix)
+
+
+@prof.timed("sort_savings")
+def positive_savings_pairs(s_matrix, top_k=None):
+    """This function selects the strictly positive savings of a savings matrix and sorts them in descending order.
+    Returns a tuple (sorted_savings, client_pairs) where sorted_savings is a one-dimensional float numpy array and
+    client_pairs is a (m, 2) int32 numpy array: row j holds the indices (i, k) of the clients associated with
+    sorted_savings[j]. If top_k is given, only the top_k best pairs are kept, they are found by partial selection
+    before being sorted. Equal savings are kept in row-major order of the matrix, also when they are cut by top_k: the
+    first ones in row-major order are kept."""
+    flat_savings = s_matrix.ravel()
+    flat_indices = np.flatnonzero(flat_savings > 0)
+    savings = flat_savings[flat_indices]
+    if top_k is not None and top_k < len(savings):
+        if top_k > 0:
+            threshold = np.partition(savings, len(savings) - top_k)[len(savings) - top_k]  # top_k-th best saving
+            ties = np.flatnonzero(savings == threshold)
+            selection = np.flatnonzero(savings > threshold)
+            selection = np.sort(np.concatenate((selection, ties[:top_k - len(selection)])))
+        else:
+            selection = []
+        flat_indices = flat_indices[selection]
+        savings = savings[selection]
+    order = np.argsort(-savings, kind="stable")
+    client_pairs = np.empty((len(order), 2), dtype=np.int32)
+    client_pairs[:, 0], client_pairs[:, 1] = np.divmod(flat_indices[order], s_matrix.shape[1])
+    if prof.current is not None:
+        prof.current.count("savings_pairs", len(order))
+    return savings[order], client_pairs
+
+
+def pair_costs(problem, parameters, points_a, points_b):
+    """Returns the costs of the legs from the points points_a to the points points_b (arrays of point indices, 0 being
+    the depot and i + 1 the i-th client, like in the cost matrix) as a numpy array."""
+    points_a, points_b = np.broadcast_arrays(np.asarray(points_a), np.asarray(points_b))
+    batch_cost_func = getattr(parameters.cost_func, "batch", None)
+    if batch_cost_func is not None:
+        x, y = problem_coordinates(problem)
+        return batch_cost_func(x[points_a], y[points_a], x[points_b], y[points_b], parameters.drone, parameters.wind)
+    points = [problem.depot] + problem.clients_list
+    return np.array([parameters.cost_func(points[a], points[b], parameters.drone, parameters.wind)
+                     for a, b in zip(points_a.ravel().tolist(), points_b.ravel().tolist())],
+                    dtype=float).reshape(points_a.shape)
+
+
+@prof.timed("sparse_savings")
+def sparse_savings_pairs(problem, parameters, k_nearest, radius=None):
+    """Sparse version of positive_savings_pairs(savings_matrix(problem, parameters)): the savings are computed only
+    for the pairs made of a client and one of its k_nearest nearest neighbours (within radius if it is given), in
+    both directions, so that time and memory grow linearly with the number of clients. The neighbours are found with
+    a spatial index (see SpatialIndex.KDTreeIndex, that also suits clustered clients). A larger k_nearest gives a
+    result closer to the dense one.
+    Returns (sorted_savings, client_pairs) in the same form as positive_savings_pairs."""
+    nb_clients = problem.number_of_clients
+    x, y = problem_coordinates(problem)
+    neighbours, _ = spi.KDTreeIndex(x[1:], y[1:]).k_nearest(k_nearest, radius)
+    rows = np.repeat(np.arange(nb_clients, dtype=np.int64), neighbours.shape[1])
+    columns = neighbours.ravel()
+    rows, columns = rows[columns >= 0], columns[columns >= 0]
+    # every pair once and in both directions, in row-major order like in the savings matrix
+    a, b = np.divmod(np.unique(np.concatenate((rows * nb_clients + columns, columns * nb_clients + rows))),
+                     nb_clients)
+    clients = np.arange(1, nb_clients + 1)
+    to_depot = pair_costs(problem, parameters, clients, 0)
+    from_depot = pair_costs(problem, parameters, 0, clients)
+    savings = to_depot[a] + from_depot[b] - pair_costs(problem, parameters, a + 1, b + 1)
+    positive = savings > 0
+    a, b, savings = a[positive], b[positive], savings[positive]
+    order = np.argsort(-savings, kind="stable")
+    client_pairs = np.empty((len(order), 2), dtype=np.int32)
+    client_pairs[:, 0], client_pairs[:, 1] = a[order], b[order]
+    if prof.current is not None:
+        prof.current.count("savings_pairs", len(order))
+    return savings[order], client_pairs
+
+
+def clarke_and_wright_init(problem, parameters, c_matrix=None, as_indices=False, top_k=None, s_matrix=None,
+                           k_nearest=None, radius=None):
     """This function initializes the Clarke and Wright algorithm.
-    This function calculates the savings matrix and returns a tuple (sorted_savings, client_pairs) where:
+    This function calculates the savings matrix (from c_matrix if a precomputed cost matrix is given, unless the
+    savings matrix s_matrix is given) and returns a tuple (sorted_savings, client_pairs) where:
     sorted_savings = the sorted savings in a one-dimensional numpy array (sorted in descending order)
     client_pairs = list of tuples in the form (client_i, client_j) where client_i and client_j are clients of the
     problem. client_i and client_j of the k-th tuple represent the clients associated with the k-th value of
-    sorted_savings."""
+    sorted_savings.
+    If as_indices is True, only the strictly positive savings are kept and client_pairs is a compact (m, 2) int32
+    numpy array of client indices in problem.clients_list (see positive_savings_pairs). top_k optionally limits the
+    result to the top_k best pairs. Both build functions accept the two representations.
+    If k_nearest is given, the savings are only computed between neighbouring clients (see sparse_savings_pairs) and
+    the pairs are returned as indices. No matrix is computed then."""
     
+    if parameters.cost_func and k_nearest is not None:
+        return sparse_savings_pairs(problem, parameters, k_nearest, radius)
     if parameters.cost_func:
-        the_list = savings_matrix(problem, parameters).flatten()
-        indice_list = np.argsort(the_list)
-        sorted_savings = []
-        clients_pairs = []
-        for j in range(0, len(indice_list)):
-            k = indice_list[j]
-            sorted_savings.append(the_list[k])
-            a = k // len(problem.clients_list)
-            b = k % len(problem.clients_list)
-            # problem.clients_list[a].identifier = "client_{}".format(a)
-            # problem.clients_list[b].identifier = "client_{}".format(b)
-            clients_pairs.append((problem.clients_list[a], problem.clients_list[b]))
-            # clients_pairs.append(({client_{}}.format(problem.clients_list[a]),{}.format(problem.clients_list[b]))
-        sorted_savings.reverse()
-        clients_pairs.reverse()
-        np_sorted_savings = np.array(sorted_savings)
-        return np_sorted_savings, clients_pairs
+        if s_matrix is None:
+            s_matrix = savings_matrix(problem, parameters, c_matrix)
+        if as_indices:
+            return positive_savings_pairs(s_matrix, top_k)
+        the_list = s_matrix.flatten()
+        indice_list = np.argsort(the_list)[::-1]  # descending order
+        rows, columns = np.divmod(indice_list, len(problem.clients_list))
+        clients_pairs = [(problem.clients_list[a], problem.clients_list[b])
+                         for a, b in zip(rows.tolist(), columns.tolist())]
+        return the_list[indice_list], clients_pairs
     else:
         return [], []
 
 
+def pairs_as_indices(problem, client_pairs):
+    """Returns client_pairs as a (m, 2) int32 numpy array of client indices in problem.clients_list. client_pairs can
+    be such an array already, or a list of tuples of clients as returned by clarke_and_wright_init."""
+    if isinstance(client_pairs, np.ndarray):
+        return client_pairs
+    index_of = {id(client): i for i, client in enumerate(problem.clients_list)}
+    return np.array([(index_of[id(client_a)], index_of[id(client_b)]) for client_a, client_b in client_pairs],
+                    dtype=np.int32).reshape(-1, 2)
+
+
+def pair_chunks(problem, sorted_savings, client_pairs, chunk_size=None):
+    """Yields the pairs of clients that have a non-negative saving, as (m, 2) int32 numpy arrays of client indices, in
+    descending order of savings. sorted_savings and client_pairs are either the result of clarke_and_wright_init, or
+    client_pairs is None and sorted_savings is an iterable of chunks (savings, client_pairs) that follow each other
+    in descending order of savings (see OutOfCore.merge_runs). Chunks are read only when they are needed. If
+    chunk_size is given, the arrays yielded have chunk_size rows at most."""
+    chunks = sorted_savings if client_pairs is None else [(sorted_savings, client_pairs)]
+    for savings, pairs in chunks:
+        pairs = pairs_as_indices(problem, pairs)[np.asarray(savings, dtype=float) >= 0]
+        step = chunk_size or max(len(pairs), 1)
+        for start in range(0, len(pairs), step):
+            yield pairs[start:start + step]
 
-def add_single_client_deliveries(deliveries_list, problem, parameters):
+
+def routes_to_deliveries(problem, parameters, routes, c_matrix=None):
+    """Converts routes given as lists of client indices into a list of instances of class Delivery (that use the cost
+    matrix c_matrix if it is given)."""
+    return [dro.Delivery(dro.Route([problem.clients_list[i] for i in route], problem.depot,
+                                   np.array(route, dtype=np.int32)), parameters, c_matrix)
+            for route in routes]
+
+
+def add_single_client_deliveries(deliveries_list, problem, parameters, c_matrix=None):
     """This function modifies the deliveries_list argument by adding deliveries containing a single client.
     Only clients that are present in the problem but not present in any delivery are added. It first checks that the
-    client can legally be delivered."""
+    client can legally be delivered. The new deliveries use the cost matrix c_matrix if it is given."""
     
-    list_of_clients = []
-    for delivery in deliveries_list:
-        for j in range(len(delivery.clients_list)):
-            list_of_clients.append(delivery.clients_list[j])
-    absent_clients = []
-    for client in problem.clients_list:
-        client_number_of_apparence = 0
-        for client_already_present in list_of_clients:
-            if client == client_already_present:
-                client_number_of_apparence += 1
-        if client_number_of_apparence == 0:
-            absent_clients.append(client)
-    # return absent_clients
-    for absent_one in absent_clients:
-        route_absent_one = pre.Route([absent_one], problem.depot)
-        delivery_absent_one = pre.Delivery(route_absent_one, parameters)
+    coverage = dro.ClientCoverage(deliveries_list)
+    absent_clients = [(i, client) for i, client in enumerate(problem.clients_list) if client not in coverage]
+    for i, absent_one in absent_clients:
+        route_absent_one = dro.Route([absent_one], problem.depot, np.array([i], dtype=np.int32))
+        delivery_absent_one = dro.Delivery(route_absent_one, parameters, c_matrix)
         if delivery_absent_one.is_legal:
             deliveries_list.append(delivery_absent_one)
     return deliveries_list
@@ -258,7 +504,8 @@ def search_deliveries_for_client(client, deliveries_list, include_first=True, in
     for delivery in deliveries_list:
         nb_clients = len(delivery.clients_list)
         if include_interior and nb_clients >= 3:
-            if client in delivery.clients_list[1:-1]:
+            if client in delivery.route and client is not delivery.clients_list[0] and \
+                    client is not delivery.clients_list[-1]:
                 return delivery
         if include_first and nb_clients >= 1:
             if client == delivery.clients_list[0]:
@@ -269,134 +516,221 @@ def search_deliveries_for_client(client, deliveries_list, include_first=True, in
     return None
 
 
-def sequential_build_deliveries(problem, parameters, sorted_savings, client_pairs):
+@prof.timed("build_deliveries")
+def sequential_build_deliveries(problem, parameters, sorted_savings, client_pairs, c_matrix=None):
     """This function returns a list of instances of class Delivery calculated with the use of the sequential Clarke
-    and Wright algorithm. Single client deliveries are added at the end if necessary."""
-    
-    deliveries_list = []
-    j = 0
-    # clients_restants = problem.clients_list
-    client_pairs_modifie = client_pairs
-    while j < len(client_pairs)+1:
-        i = -1
-        a = 0
-        k = 0
-        while k < len(client_pairs_modifie):
-            pair = client_pairs_modifie[k]
-            if sorted_savings[k] >= 0:
-                if i < 0:   
-                    route_a = dro.Route([], problem.depot)
-                    delivery_a = dro.Delivery(route_a, parameters)
+    and Wright algorithm. Single client deliveries are added at the end if necessary. If the cost matrix c_matrix is
+    given, the deliveries use it to evaluate their cost (see class Delivery).
+    Routes are built one at a time. A route is started with the best pair of clients that are not routed yet, then it
+    is extended, at either end, with the best pair that links one of its ends to a client that is not routed yet, until
+    no pair can extend it. The pairs of each client are kept in adjacency lists sorted by savings, and a pair that can
+    no longer extend the current route is never looked at again. A stream of chunks of savings (see pair_chunks) is
+    read entirely, since the best pair of a client can come last, but only the pairs are kept.
+    The pairs stay in int32 arrays: the adjacency lists are one array of pair numbers sorted by client with the
+    bounds of each client (compressed rows), read from a cursor per client by small windows, and the seeds are read
+    by blocks from which the pairs with a routed client are removed at once."""
+
+    client_pairs = np.concatenate([np.empty((0, 2), dtype=np.int32)] +
+                                  list(pair_chunks(problem, sorted_savings, client_pairs)))
+    demands_array = problem.demand
+    demands = demands_array.tolist()
+    capacity = parameters.drone.capacity
+    nb_clients = len(demands)
+    firsts = np.ascontiguousarray(client_pairs[:, 0])
+    seconds = np.ascontiguousarray(client_pairs[:, 1])
+    nb_pairs = len(firsts)
+    del client_pairs
+
+    def adjacency(column):
+        # pair numbers grouped by client and the bounds of the groups; in each group the pair numbers are increasing,
+        # ie the savings decreasing
+        order = np.argsort(column, kind="stable").astype(np.int32)
+        bounds = np.searchsorted(column[order], np.arange(nb_clients + 1)).tolist()
+        return order, bounds
+
+    outgoing, bounds_out = adjacency(firsts)  # pairs (c, x): x can be added after c
+    incoming, bounds_in = adjacency(seconds)  # pairs (x, c): x can be added before c
+    positions_out = bounds_out[:-1]  # cursor of each client in outgoing
+    positions_in = bounds_in[:-1]
+    routed = np.zeros(nb_clients, dtype=bool)
+
+    def best_extension(end, pairs, bounds, positions, others, route_demand):
+        # returns the number of the best pair that extends the route at 'end', or None. Pairs that are skipped can
+        # not extend this route anymore: their other client is routed or the route's demand only grows.
+        position, limit = positions[end], bounds[end + 1]
+        while position < limit:
+            window = pairs[position:min(position + 64, limit)]
+            candidates = others[window]
+            usable = ~routed[candidates] & (route_demand + demands_array[candidates] <= capacity)
+            hit = int(usable.argmax())
+            if usable[hit]:
+                positions[end] = position + hit
+                return int(window[hit])
+            position += len(window)
+        positions[end] = position
+        return None
+
+    clients_routes = []
+    for start in range(0, nb_pairs, 4096):
+        seeds = np.arange(start, min(start + 4096, nb_pairs))
+        a, b = firsts[seeds], seconds[seeds]
+        seeds = seeds[(a != b) & ~routed[a] & ~routed[b] & (demands_array[a] + demands_array[b] <= capacity)]
+        for a, b in zip(firsts[seeds].tolist(), seconds[seeds].tolist()):
+            if routed[a] or routed[b]:  # routed by an earlier seed of the block
+                continue
+            route = collections.deque((a, b))
+            route_demand = demands[a] + demands[b]
+            routed[a] = routed[b] = True
+            while True:
+                after = best_extension(route[-1], outgoing, bounds_out, positions_out, seconds, route_demand)
+                before = best_extension(route[0], incoming, bounds_in, positions_in, firsts, route_demand)
+                if after is None and before is None:
+                    break
+                if before is None or (after is not None and after < before):
+                    added = int(seconds[after])
+                    route.append(added)
                 else:
-                    delivery_a = deliveries_list[-1]
-                route_b = dro.Route([pair[0], pair[1]], problem.depot)
-                delivery_b = dro.Delivery(route_b, parameters)
-                delivery_c = sequential_merge_if_possible(delivery_a, delivery_b)
-                # if k == 3 and j == 1:
-                #     print (4, delivery_a.clients_list, delivery_b.clients_list, delivery_c)
-                if delivery_c:
-                    if i < 0:
-                        deliveries_list.append(delivery_c)
-                        i += 1
-                    else:
-                        deliveries_list[-1] = delivery_c
-                        k = 0
-                    # a = 0
-                if not delivery_c:
-                    a += 1
-            k += 1
-        if a == len(client_pairs_modifie):
-            add_single_client_deliveries(deliveries_list, problem, parameters)
-            # for delivery in deliveries_list:
-            #     delivery.print()
-            return deliveries_list
-        client_pairs_modifie = []
-        for k, pair in enumerate(client_pairs):
-            if (search_deliveries_for_client(pair[0], deliveries_list) is None) and \
-                    (search_deliveries_for_client(pair[1], deliveries_list) is None):
-                client_pairs_modifie.append(pair)
-        # if j == 0:
-        #     print(client_pairs_modifie)
-        
-        # clients_restants = []
-        # for client in problem.clients_list:
-        #     if search_deliveries_for_client(client, deliveries_list) is None:
-        #         clients_restants.append(client)
-        j += 1
+                    added = int(firsts[before])
+                    route.appendleft(added)
+                routed[added] = True
+                route_demand += demands[added]
+            clients_routes.append(list(route))
+    if prof.current is not None:  # seeds, then pairs skipped or taken at the ends of the routes
+        prof.current.count("merge_attempts", nb_pairs + sum(positions_out) - sum(bounds_out[:-1]) +
+                           sum(positions_in) - sum(bounds_in[:-1]))
+        prof.current.count("merges", sum(len(route) - 1 for route in clients_routes))
+
+    deliveries_list = routes_to_deliveries(problem, parameters, clients_routes, c_matrix)
+    add_single_client_deliveries(deliveries_list, problem, parameters, c_matrix)
+    return deliveries_list
 
 
-def parallel_build_deliveries(problem, parameters, sorted_savings, client_pairs):
+@prof.timed("build_deliveries")
+def parallel_build_deliveries(problem, parameters, sorted_savings, client_pairs, c_matrix=None, initial_routes=None):
     """This function returns a list of instances of class Delivery calculated with the use of the parallel Clarke
-    and Wright algorithm. Single client deliveries are added at the end if necessary."""
-    
-    deliveries_list = []
-    for k, pair in enumerate(client_pairs):
-        # print(k)
-        if sorted_savings[k] >= 0:
-            route_b = pre.Route([pair[0], pair[1]], problem.depot)
-            delivery_b = pre.Delivery(route_b, parameters)
-            if delivery_b.is_legal:
-                if len(deliveries_list) == 0:
-                    deliveries_list.append(delivery_b)
-                else:
-                    route_b = pre.Route([pair[0], pair[1]], problem.depot)
-                    delivery_b = pre.Delivery(route_b, parameters)
-                    if search_deliveries_for_client(pair[0], deliveries_list, False, False, True) and \
-                            search_deliveries_for_client(pair[1], deliveries_list, True, False, False):
-                        delivery_c = search_deliveries_for_client(pair[0], deliveries_list, False, False, True)
-                        delivery_d = search_deliveries_for_client(pair[1], deliveries_list, True, False, False)
-                        delivery_e = sequential_merge_if_possible(delivery_b, delivery_c)
-                        # delivery_f = sequential_merge_if_possible(delivery_b, delivery_d)
-                        if delivery_e and delivery_d:
-                            delivery_z = sequential_merge_if_possible(delivery_e, delivery_d)
-                            if delivery_z:
-                                deliveries_list.append(delivery_z)
-                                deliveries_list.remove(delivery_c)
-                                deliveries_list.remove(delivery_d)
-                    elif not search_deliveries_for_client(pair[0], deliveries_list, False, False, True) and \
-                            search_deliveries_for_client(pair[1], deliveries_list, True, False, False):
-                        delivery_d = search_deliveries_for_client(pair[1], deliveries_list, True, False, False)
-                        delivery_z = sequential_merge_if_possible(delivery_b, delivery_d)
-                        if delivery_z and not search_deliveries_for_client(pair[0], deliveries_list):
-                            deliveries_list.append(delivery_z)
-                            deliveries_list.remove(delivery_d)
-                    elif search_deliveries_for_client(pair[0], deliveries_list, False, False, True) and not \
-                            search_deliveries_for_client(pair[1], deliveries_list, True, False, False):
-                        delivery_c = search_deliveries_for_client(pair[0], deliveries_list, False, False, True)
-                        delivery_z = sequential_merge_if_possible(delivery_c, delivery_b)
-                        if delivery_z and not search_deliveries_for_client(pair[1], deliveries_list):
-                            deliveries_list.append(delivery_z)
-                            deliveries_list.remove(delivery_c)
-                    elif not search_deliveries_for_client(pair[0], deliveries_list, False, False, True) and not \
-                            search_deliveries_for_client(pair[1], deliveries_list, True, False, False):
-                        if not search_deliveries_for_client(pair[0], deliveries_list) and not \
-                                search_deliveries_for_client(pair[1], deliveries_list) and delivery_b:
-                            deliveries_list.append(delivery_b)
-    add_single_client_deliveries(deliveries_list, problem, parameters)
-    # for delivery in deliveries_list:
-    #     delivery.print()
+    and Wright algorithm. Single client deliveries are added at the end if necessary. If the cost matrix c_matrix is
+    given, the deliveries use it to evaluate their cost (see class Delivery).
+    For each pair (a, b) taken in descending order of savings, the route ending with a and the route starting with b
+    are looked up in dictionaries indexed by the endpoints of the routes, so that each merge check and each merge is
+    done in constant time. A stream of chunks of savings (see pair_chunks) is read one chunk at a time.
+    A client that has a successor (or a predecessor) keeps it, so the pairs where it comes first (or second) can not
+    lead to a merge anymore: they are removed from each chunk, along with the pairs that exceed the capacity, before
+    the chunk is read pair by pair.
+    initial_routes: optional list of routes (lists of client indices) that the algorithm starts from instead of
+    single clients, for instance the fragments of a previous solution (see WarmStart). They must be legal."""
+
+    demands = problem.demand.tolist()
+    capacity = parameters.drone.capacity
+    demands_array = np.array(demands)
+    has_successor = np.zeros(len(demands), dtype=bool)
+    has_predecessor = np.zeros(len(demands), dtype=bool)
+
+    def useful_pairs():
+        for chunk in pair_chunks(problem, sorted_savings, client_pairs, chunk_size=4096):
+            a, b = chunk[:, 0], chunk[:, 1]
+            chunk = chunk[~has_successor[a] & ~has_predecessor[b] & (demands_array[a] + demands_array[b] <= capacity)]
+            if prof.current is not None:
+                prof.current.count("merge_attempts", len(chunk))
+            yield from chunk.tolist()
+
+    routes = {}  # route number -> [first client, last client, total demand], in the order of the deliveries list
+    head = {}  # first client of a route -> route number
+    tail = {}  # last client of a route -> route number
+    successor = {}  # client -> next client on its route
+    routed = set()
+    for number, route in enumerate(initial_routes or []):
+        if len(route) < 2:  # a single client is not a route yet
+            continue
+        number = -1 - number  # the pair numbers are not negative
+        routes[number] = [route[0], route[-1], sum(demands[client] for client in route)]
+        head[route[0]] = tail[route[-1]] = number
+        for a, b in zip(route[:-1], route[1:]):
+            successor[a] = b
+            has_successor[a] = has_predecessor[b] = True
+        routed.update(route)
+    initial_links = len(successor)
+    for number, (a, b) in enumerate(useful_pairs()):
+        if a == b or demands[a] + demands[b] > capacity:
+            continue
+        route_c = tail.get(a)  # route ending with a
+        route_d = head.get(b)  # route starting with b
+        if route_c is not None and route_d is not None:
+            if route_c == route_d or routes[route_c][2] + routes[route_d][2] > capacity:
+                continue
+            first, _, demand_c = routes.pop(route_c)
+            _, last, demand_d = routes.pop(route_d)
+            new_route = [first, last, demand_c + demand_d]
+        elif route_d is not None:
+            if a in routed or routes[route_d][2] + demands[a] > capacity:
+                continue
+            _, last, demand_d = routes.pop(route_d)
+            new_route = [a, last, demand_d + demands[a]]
+            routed.add(a)
+        elif route_c is not None:
+            if b in routed or routes[route_c][2] + demands[b] > capacity:
+                continue
+            first, _, demand_c = routes.pop(route_c)
+            new_route = [first, b, demand_c + demands[b]]
+            routed.add(b)
+        else:
+            if a in routed or b in routed:
+                continue
+            new_route = [a, b, demands[a] + demands[b]]
+            routed.add(a)
+            routed.add(b)
+        successor[a] = b
+        has_successor[a] = has_predecessor[b] = True
+        tail.pop(a, None)
+        head.pop(b, None)
+        routes[number] = new_route
+        head[new_route[0]] = tail[new_route[1]] = number
+    if prof.current is not None:
+        prof.current.count("merges", len(successor) - initial_links)
+
+    clients_routes = []
+    for first, last, _ in routes.values():
+        route = [first]
+        while route[-1] != last:
+            route.append(successor[route[-1]])
+        clients_routes.append(route)
+    deliveries_list = routes_to_deliveries(problem, parameters, clients_routes, c_matrix)
+    add_single_client_deliveries(deliveries_list, problem, parameters, c_matrix)
     return deliveries_list
 
 
-def build_deliveries(problem, parameters, version, sorted_savings, client_pairs):
+def build_deliveries(problem, parameters, version, sorted_savings, client_pairs, c_matrix=None):
     """Returns a list of deliveries resulting from the use of the Clarke and Wright algorithm.
     :param problem: problem to solve
     :param parameters: parameters of the deliveries
     :param version: version of the Clarke and Wright algorithm. Must be "Sequential" or "Parallel".
     :param sorted_savings: list of the savings sorted in descending order. Result of clarke_and_wright_init.
-    :param client_pairs: list of pairs of clients relative to sorted_savings. Result of clarke_and_wright_init.
+    :param client_pairs: list of pairs of clients (or array of pairs of client indices) relative to sorted_savings.
+    Result of clarke_and_wright_init. If it is None, sorted_savings is a stream of chunks (see pair_chunks).
+    :param c_matrix: optional cost matrix used by the deliveries to evaluate their cost.
     :return list: list of instances of class Delivery.
     """
     if version == "sequential":
-        return sequential_build_deliveries(problem, parameters, sorted_savings, client_pairs)
+        return sequential_build_deliveries(problem, parameters, sorted_savings, client_pairs, c_matrix)
     if version == "parallel":
-        return parallel_build_deliveries(problem, parameters, sorted_savings, client_pairs)
+        return parallel_build_deliveries(problem, parameters, sorted_savings, client_pairs, c_matrix)
     return []
 
 
-def clarke_and_wright(problem, parameters, version="sequential", name=None, verbose=True):
-    """Solves a problem using the clarke and Wright algorithm. Creates a solution and appends it to the end of the
-    solutions list of the problem."""
+def clarke_and_wright(problem, parameters, version="sequential", name=None, verbose=True, cache=None, k_nearest=None,
+                      radius=None, profile=False):
+    """Solves a problem using the clarke and Wright algorithm. Creates a solution, appends it to the end of the
+    solutions list of the problem and returns it.
+    cache: optional instance of MatrixCache.MatrixCache where the cost and savings matrices are looked up.
+    k_nearest, radius: if k_nearest is given, only the savings between each client and its k_nearest nearest
+    neighbours are used (see sparse_savings_pairs) and no cost or savings matrix is computed. This is meant for very
+    large problems, k_nearest trades the quality of the solution for speed and memory.
+    profile: if True, the solve is profiled and the solution has an attribute profile_report (see Profiling)."""
+    if profile:
+        with prof.profiling() as profiler:
+            solution = clarke_and_wright(problem, parameters, version, name, verbose, cache, k_nearest, radius)
+        if solution is not None:
+            solution.profile_report = profiler.report()
+        return solution
     if version != "sequential" and version != "parallel":
         print("Unexpected version : {}".format(version))
         print("Please use 'sequential' or 'parallel'")
@@ -406,13 +740,22 @@ def clarke_and_wright(problem, parameters, version="sequential", name=None, verb
 
     if verbose:
         print("Initialising Clarke & Wright {} version...".format(version), end=' ', flush=True)
-    init = clarke_and_wright_init(problem, parameters)
+    c_matrix = s_matrix = None
+    if k_nearest is None and parameters.cost_func:
+        if cache is not None:
+            c_matrix = cache.cost_matrix(problem, parameters)
+            s_matrix = cache.savings_matrix(problem, parameters)
+        else:
+            c_matrix = cost_matrix(problem, parameters)
+    init = clarke_and_wright_init(problem, parameters, c_matrix, as_indices=True, s_matrix=s_matrix,
+                                  k_nearest=k_nearest, radius=radius)
     if verbose:
         print("done !")
 
         print("Building deliveries...".format(version), end=' ', flush=True)
-    deliveries_list = build_deliveries(problem, parameters, version, *init)
-    problem.solutions_list.append(pre.Solution(name, deliveries_list, parameters))
+    deliveries_list = build_deliveries(problem, parameters, version, *init, c_matrix=c_matrix)
+    problem.solutions_list.append(dro.Solution(name, deliveries_list, parameters))
     if verbose:
         print("done !")
-        problem.solutions_list[-1].print(False)
\ No newline at end of file
+        problem.solutions_list[-1].print(False)
+    return problem.solutions_list[-1]
\ No newline at end of file
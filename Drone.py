@@ -1,4 +1,6 @@
+import csv
 import numpy as np
+import Profiling as prof
 
 class Drone:
 
@@ -46,6 +48,70 @@ class Wind:
         else:
             self.x = target_speed
 
+
+class WindField:
+    """Wind that varies in space, given by a forecast on a regular grid. The wind between the nodes of the grid is
+    interpolated bilinearly, and outside of the grid it is the wind of the nearest edge. The costs of the legs flown
+    in a wind field are integrated along the legs (see CostFunction.batch_cost_a), with samples spaced by step at
+    most (half the smallest spacing of the grid by default)."""
+
+    def __init__(self, x_coordinates, y_coordinates, u, v, step=None):
+        self.x_coordinates = np.asarray(x_coordinates, dtype=float)  # increasing abscissas of the columns of the grid
+        self.y_coordinates = np.asarray(y_coordinates, dtype=float)  # increasing ordinates of the rows of the grid
+        self.u = np.asarray(u, dtype=float)  # x components of the wind at the nodes, shape (rows, columns)
+        self.v = np.asarray(v, dtype=float)  # y components of the wind at the nodes, shape (rows, columns)
+        assert self.u.shape == self.v.shape == (len(self.y_coordinates), len(self.x_coordinates))
+        # a grid with a single column (or row) is made of two equal ones, so that every point lies in a cell
+        if len(self.x_coordinates) == 1:
+            self.x_coordinates = np.append(self.x_coordinates, self.x_coordinates[0] + 1.)
+            self.u, self.v = np.repeat(self.u, 2, axis=1), np.repeat(self.v, 2, axis=1)
+        if len(self.y_coordinates) == 1:
+            self.y_coordinates = np.append(self.y_coordinates, self.y_coordinates[0] + 1.)
+            self.u, self.v = np.repeat(self.u, 2, axis=0), np.repeat(self.v, 2, axis=0)
+        if step is None:
+            spacings = np.concatenate((np.diff(self.x_coordinates), np.diff(self.y_coordinates)))
+            step = spacings.min() / 2 if len(spacings) else np.inf
+        self.step = step
+
+    def __repr__(self):
+        return "<WindField at {}. {}x{} grid ; max speed = {} m.s-1>".format(
+            hex(id(self)), len(self.x_coordinates), len(self.y_coordinates), self.speed)
+
+    @property
+    def vector(self):
+        """Returns the mean wind over the nodes of the grid."""
+        return np.array((self.u.mean(), self.v.mean()))
+
+    @property
+    def speed(self):
+        """Returns the highest speed of the wind over the grid (m.s-1). Bilinear interpolation never exceeds it."""
+        return np.hypot(self.u, self.v).max()
+
+    def at(self, x, y):
+        """Returns the wind (u, v) at the points (x, y), where x and y are numpy arrays of the same shape."""
+        u = np.empty(np.shape(x))
+        v = np.empty(np.shape(x))
+        column, t = self._cell(self.x_coordinates, x)
+        row, s = self._cell(self.y_coordinates, y)
+        for grid, wind in ((self.u, u), (self.v, v)):
+            wind[...] = (grid[row, column] * (1 - t) + grid[row, column + 1] * t) * (1 - s) + \
+                (grid[row + 1, column] * (1 - t) + grid[row + 1, column + 1] * t) * s
+        return u, v
+
+    @staticmethod
+    def _cell(coordinates, values):
+        # returns the indices of the cells that hold the values and the relative positions of the values in them
+        index = np.clip(np.searchsorted(coordinates, values, side="right") - 1, 0, len(coordinates) - 2)
+        relative = (np.asarray(values) - coordinates[index]) / (coordinates[index + 1] - coordinates[index])
+        return index, np.clip(relative, 0., 1.)
+
+    def fingerprint(self):
+        """Returns bytes that identify the forecast (see MatrixCache.wind_fingerprint)."""
+        return b"".join(np.ascontiguousarray(array).tobytes() for array in
+                        (np.array(self.u.shape, dtype=np.int64), self.x_coordinates, self.y_coordinates, self.u, self.v,
+                         np.array([self.step], dtype=float)))
+
+
 class Point:
     #  """This class represents a point on the map. x and y are the coordinates of the point."""
 
@@ -89,9 +155,16 @@ class Depot(Point):
 
 
 class Route:
-    def __init__(self, clients_list, depot):
+    __slots__ = ("_clients_list", "depot", "indices", "_total_demand", "_members")
+
+    def __init__(self, clients_list, depot, indices=None):
+        if prof.current is not None:
+            prof.current.count("routes")
         self.clients_list = clients_list  # python list of instances of class Client
         self.depot = depot  # instance of class Depot. A route always starts and ends at a depot.
+        # Optional numpy int32 array: indices of the clients in the clients list of their problem (so that index + 1 is
+        # their row in the cost matrix).
+        self.indices = indices
 
     def __repr__(self):  
         return "<Route at {}. [".format(hex(id(self))) + ", ".join([repr(cl) for cl in self.clients_list]) + \
@@ -101,23 +174,44 @@ class Route:
         return "Route at {}. [".format(hex(id(self))) + ", ".join([str(cl) for cl in self.clients_list]) + \
                "]. {}.".format(str(self.depot))
 
+    def __contains__(self, client):
+        return client in self.members
+
+    @property
+    def clients_list(self):
+        return self._clients_list
+
+    @clients_list.setter
+    def clients_list(self, new_list):
+        """The total demand and the set of clients are cached, so the list of clients must be replaced rather than
+        modified in place."""
+        self._clients_list = new_list
+        self._total_demand = None
+        self._members = None
+        self.indices = None
+
+    @property
+    def members(self):
+        """Returns the set of the clients of the route."""
+        if self._members is None:
+            self._members = set(self._clients_list)
+        return self._members
+
     @property
     def total_demand(self):
         """This method returns the total demand of all the clients of the route."""
-        total = 0
-        for i in range(0, len(self.clients_list)):
-            total += self.clients_list[i].demand
-        return total
+        if self._total_demand is None:
+            total = 0
+            for client in self._clients_list:
+                total += client.demand
+            self._total_demand = total
+        return self._total_demand
 
     @property
     def is_legal(self):
         """This method returns True if the route does not break any rule of the delivery problem. It returns False
         otherwise."""
-        for i in range(0, len(self.clients_list) - 1):
-            for j in range(i + 1, len(self.clients_list)):
-                if self.clients_list[i] == self.clients_list[j]:
-                    return False
-        return True
+        return len(self.members) == len(self._clients_list)
 
     def check_same_depot(self, other_route):
         """This method returns True if this route has the same depot as other_route and False otherwise."""
@@ -126,6 +220,22 @@ class Route:
         else:
             return False
 
+    def merged_with(self, other_route, common_client=False):
+        """Returns a new route whose clients are the clients of this route followed by the clients of other_route. If
+        common_client is True, the first client of other_route is the last client of this route and it is not
+        duplicated. The total demand, the set of clients and the indices of the new route are derived from those of the
+        two routes instead of being computed again."""
+        start = 1 if common_client else 0
+        other_clients = other_route.clients_list[start:]
+        new_route = Route(self._clients_list + other_clients, self.depot)
+        new_route._total_demand = self.total_demand + other_route.total_demand
+        if common_client:
+            new_route._total_demand -= other_route.clients_list[0].demand
+        new_route._members = self.members.union(other_clients)
+        if self.indices is not None and other_route.indices is not None:
+            new_route.indices = np.concatenate((self.indices, other_route.indices[start:]))
+        return new_route
+
 
 class DeliveryParameters:
     def __init__(self,drone,wind,cost_func=None):
@@ -137,33 +247,43 @@ class DeliveryParameters:
         
 
 class  Delivery:
-    def __init__(self,route: Route, parameters: DeliveryParameters):
+    __slots__ = ("route", "parameters", "c_matrix", "_cost", "_savings", "_evaluated_indices")
+
+    def __init__(self,route: Route, parameters: DeliveryParameters, c_matrix=None):
+        if prof.current is not None:
+            prof.current.count("deliveries")
         self.route = route
         self.parameters = parameters
+        # Optional cost matrix of the problem for these parameters. If the route knows the indices of its clients, the
+        # cost and the savings are read from this matrix instead of calling the cost function, and they are cached.
+        self.c_matrix = c_matrix
+        self._cost = None
+        self._savings = None
+        self._evaluated_indices = None  # route.indices when _cost and _savings were evaluated
 
     @property
     def clients_list(self):
-        self.route.clients_list
+        return self.route.clients_list
     
-    @property
+    @clients_list.setter
     def clients_list(self, new_list):
         self.route.clients_list = new_list
     
     @property
     def total_demand(self):
-        self.route.depot
+        return self.route.total_demand
 
     @property
     def depot(self):
-        self.route.depot
+        return self.route.depot
     
     @property
     def drone(self):
-        self.parameters.drone
+        return self.parameters.drone
     
     @property 
     def wind(self):
-        self.parameters.wind
+        return self.parameters.wind
 
     @property
     def is_legal(self):
@@ -172,10 +292,37 @@ class  Delivery:
         else:
             return False
 
+    @property
+    def uses_cost_matrix(self):
+        return self.c_matrix is not None and self.route.indices is not None
+
+    def _matrix_cost_and_savings(self):
+        """Returns the cost and the savings of the delivery read from the cost matrix (cached)."""
+        if self._evaluated_indices is not self.route.indices:
+            rows = self.route.indices + 1  # row 0 of the cost matrix is the depot
+            c_matrix = self.c_matrix
+            if len(rows) == 0:
+                self._cost, self._savings = 0, 0
+            else:
+                self._cost = c_matrix[0, rows[0]] + c_matrix[rows[:-1], rows[1:]].sum() + c_matrix[rows[-1], 0]
+                self._savings = 0
+                if len(rows) > 1:
+                    self._savings = c_matrix[rows, 0].sum() + c_matrix[0, rows].sum() - self._cost
+            self._evaluated_indices = self.route.indices
+        return self._cost, self._savings
+
+    def cache_cost_and_savings(self, cost, savings):
+        """Sets the cost and the savings of a delivery that uses a cost matrix when they are already known, for
+        instance when the delivery results from a merge (see CostFunction.merge_deliveries)."""
+        self._cost, self._savings = cost, savings
+        self._evaluated_indices = self.route.indices
+
     def cost(self):
         """ Returns cost of delivery according to cost functiion"""
         if self.parameters.cost_func is None:
             return None
+        elif self.uses_cost_matrix:
+            return self._matrix_cost_and_savings()[0]
         else:
             cost = 0
             a = len(self.clients_list)
@@ -196,17 +343,20 @@ class  Delivery:
         """Returns  cost and savings based on cost function"""
         if self.parameters.cost_func is None:
             return None,None
+        elif self.uses_cost_matrix:
+            return self._matrix_cost_and_savings()
         else:
             normalcost = 0
             a = len(self.clients_list)
+            cost = self.cost()
             if a<=1:
-                return self.cost(), 0
+                return cost, 0
             else:
                 for i in range(0,len(self.clients_list)):
                     normalcost +=self.parameters.cost_func(self.clients_list[i], self.depot, self.drone, self.wind)
                     normalcost +=self.parameters.cost_func(self.depot, self.clients_list[i], self.drone, self.wind)
-                savings = normalcost - self.cost()
-                return self.cost(), savings
+                savings = normalcost - cost
+                return cost, savings
 
     def print(self):
         print("Delivery at {}".format(hex(id(self))))
@@ -214,6 +364,31 @@ class  Delivery:
         print(" total demand = {}, drone capacity = {}, wind= {}, cost {}, savings {} ".format(self.total_demand, self.drone.capacity, self.wind.vector, *self.cost_and_savings()))
 
     
+class ClientCoverage:
+    """Index of the deliveries that serve each client of a list of deliveries. It is built in linear time and
+    answers membership queries in constant time."""
+
+    def __init__(self, deliveries_list):
+        self.deliveries_of = dict()  # client -> list of the deliveries serving it (once per occurrence)
+        for delivery in deliveries_list:
+            for client in delivery.clients_list:
+                if client in self.deliveries_of:
+                    self.deliveries_of[client].append(delivery)
+                else:
+                    self.deliveries_of[client] = [delivery]
+
+    def __contains__(self, client):
+        return client in self.deliveries_of
+
+    def duplicated_clients(self):
+        """Returns the list of the clients that are served more than once."""
+        return [client for client, deliveries in self.deliveries_of.items() if len(deliveries) > 1]
+
+    def missing_clients(self, clients_list):
+        """Returns the list of the clients of clients_list that are not served."""
+        return [client for client in clients_list if client not in self.deliveries_of]
+
+
 class Solution:
 
     def __init__(self, name = "Unnamed solution", deliveries_list = None, parameters = None):
@@ -229,18 +404,27 @@ class Solution:
         for i in range(0,a):
             if self.deliveries_list[i].is_legal is False:
                 return False
-        
-        ctot = []
-        for i in range(0,a):
-            for j in self.deliveries_list[i].clients_list:
-                ctot.append(j)
-        lctot = len(ctot)
-
-        for k in range(0, lctot - 1):
-            for l in  range(k+1, lctot):
-                if ctot[k]==ctot[l]:
-                    return False
-        return True
+        return not ClientCoverage(self.deliveries_list).duplicated_clients()
+
+    def validate(self, problem=None):
+        """Checks the solution in linear time and returns a dictionary of diagnostics:
+        - "duplicated_clients": clients that are delivered more than once,
+        - "over_capacity_deliveries": deliveries whose total demand exceeds the capacity of their drone,
+        - "missing_clients": clients of problem that are not delivered (None if problem is not given),
+        - "is_legal": True if there are no duplicated clients and no over capacity deliveries,
+        - "is_complete": True if the solution is legal and delivers every client of problem (None if problem is not
+        given)."""
+        coverage = ClientCoverage(self.deliveries_list)
+        diagnostics = {"duplicated_clients": coverage.duplicated_clients(),
+                       "over_capacity_deliveries": [delivery for delivery in self.deliveries_list
+                                                    if delivery.total_demand > delivery.drone.capacity],
+                       "missing_clients": None,
+                       "is_complete": None}
+        diagnostics["is_legal"] = not diagnostics["duplicated_clients"] and not diagnostics["over_capacity_deliveries"]
+        if problem is not None:
+            diagnostics["missing_clients"] = coverage.missing_clients(problem.clients_list)
+            diagnostics["is_complete"] = diagnostics["is_legal"] and not diagnostics["missing_clients"]
+        return diagnostics
     
     def cost_and_savings(self):
         # Returns total cost and savings of solution
@@ -257,16 +441,127 @@ class Solution:
                     savings += interest[1]
             return cost, savings
 
+    def print(self, detailed=False):
+        print("Solution '{}' at {}".format(self.name, hex(id(self))))
+        print(" number of deliveries = {}, cost = {}, savings = {}".format(len(self.deliveries_list),
+                                                                          *self.cost_and_savings()))
+        if detailed:
+            for delivery in self.deliveries_list:
+                delivery.print()
+
 class Problem:
+    """The clients are stored as numpy columns (x, y, demand and identifiers, see the properties of the same names).
+    The instances of Client of clients_list are only created when it is first read, and stay the same objects after.
+    When clients_list is set, the columns are read again from it the next time they are used, and so are they when
+    its length no longer matches them (clients appended to or removed from the list). After clients of the list were
+    modified in place, replaced or reordered, update_columns must be called. add_client, remove_client and
+    generate_random_clients update the columns directly."""
 
     def __init__(self, depot = None, clients_list = None):
         self.depot = depot
-        self.clients_list = list()
         if clients_list is not None:
             self.clients_list = clients_list
+        else:
+            self.set_columns([], [], [])
         self._number_of_generated_clients  = 0
         self.solutions_list = list()
+        # matrices kept up to date when clients are added or removed (see Dynamic.IncrementalMatrices)
+        self.matrix_trackers = list()
+
+    @property
+    def clients_list(self):
+        if self._clients_list is None:  # the instances of Client are created from the columns on first use
+            self._clients_list = [Client(identifier, x, y, demand) for identifier, x, y, demand in
+                                  zip(self._identifiers[:self._size].tolist(), self._x[:self._size].tolist(),
+                                      self._y[:self._size].tolist(), self._demand[:self._size].tolist())]
+        return self._clients_list
+
+    @clients_list.setter
+    def clients_list(self, new_list):
+        self._clients_list = new_list
+        self._stale_columns = True
+
+    def update_columns(self):
+        """Reads the columns again from clients_list. It must be called after clients of the list were modified in
+        place (see the class docstring)."""
+        clients_list = self._clients_list
+        if clients_list is None:  # the columns are the only description of the clients
+            return
+        self._reset_columns()
+        self._append_columns([client.x for client in clients_list], [client.y for client in clients_list],
+                             [client.demand for client in clients_list],
+                             [client.identifier for client in clients_list])
+        self._stale_columns = False
+
+    def _sync(self):
+        clients_list = self._clients_list
+        if clients_list is not None and (self._stale_columns or len(clients_list) != self._size):
+            self.update_columns()
+
+    def set_columns(self, x, y, demand, identifiers=None):
+        """Replaces the clients of the problem by the clients described by the columns (array-likes of the same
+        length). The identifiers are "client i" (i from 1) if they are not given."""
+        x = np.asarray(x, dtype=float)
+        if identifiers is None:
+            identifiers = np.char.add("client ", np.arange(1, len(x) + 1).astype(str))
+        self._clients_list = None
+        self._stale_columns = False
+        self._reset_columns()
+        self._append_columns(x, y, demand, identifiers)
+
+    def _reset_columns(self):
+        self._size = 0
+        self._x = np.zeros(0)
+        self._y = np.zeros(0)
+        self._demand = np.zeros(0, dtype=np.int64)  # becomes a float column if a demand is not an integer
+        self._identifiers = np.zeros(0, dtype=str)
+
+    def _append_columns(self, x, y, demand, identifiers):
+        # the columns are buffers larger than needed that grow by doubling, so that add_client takes constant time
+        identifiers = np.asarray(identifiers, dtype=str)
+        demand = np.asarray(demand)
+        size = self._size + len(identifiers)
+        demand_dtype = np.result_type(self._demand, demand) if len(demand) else self._demand.dtype
+        if size > len(self._x) or identifiers.dtype.itemsize > self._identifiers.dtype.itemsize or \
+                demand_dtype != self._demand.dtype:
+            capacity = max(size, 2 * len(self._x) if size > len(self._x) else len(self._x))
+            dtype = max(identifiers.dtype, self._identifiers.dtype, key=lambda d: d.itemsize)
+            for name, new_dtype in (("_x", float), ("_y", float), ("_demand", demand_dtype), ("_identifiers", dtype)):
+                buffer = np.zeros(capacity, dtype=new_dtype)
+                buffer[:self._size] = getattr(self, name)[:self._size]
+                setattr(self, name, buffer)
+        self._x[self._size:size] = x
+        self._y[self._size:size] = y
+        self._demand[self._size:size] = demand
+        self._identifiers[self._size:size] = identifiers
+        self._size = size
+
+    def _column(self, name):
+        self._sync()
+        column = getattr(self, name)[:self._size]
+        column.flags.writeable = False
+        return column
 
+    @property
+    def x(self):
+        """Returns the x coordinates of the clients (read-only numpy array, valid until the clients change)."""
+        return self._column("_x")
+
+    @property
+    def y(self):
+        """Returns the y coordinates of the clients (read-only numpy array, valid until the clients change)."""
+        return self._column("_y")
+
+    @property
+    def demand(self):
+        """Returns the demands of the clients (read-only numpy array, valid until the clients change). Its dtype is
+        int64 while all the demands are integers, float64 otherwise."""
+        return self._column("_demand")
+
+    @property
+    def identifiers(self):
+        """Returns the identifiers of the clients (read-only numpy array, valid until the clients change)."""
+        return self._column("_identifiers")
 
     @property
     def number_of_generated_clients(self):
@@ -274,15 +569,37 @@ class Problem:
         
     @property
     def number_of_clients(self):
-        return len(self.clients_list)
+        self._sync()
+        return self._size
 
     @property
     def total_demand(self):
-        total = 0
-        for client in self.clients_list:
-            if client:
-                total += client.demand
-        return total
+        return self.demand.sum().item()
+
+    def add_client(self, client):
+        """Appends client to the clients list and updates the tracked matrices. Returns the index of the client."""
+        self._sync()
+        self.clients_list.append(client)
+        self._append_columns([client.x], [client.y], [client.demand], [client.identifier])
+        for tracker in self.matrix_trackers:
+            tracker.client_appended()
+        return self._size - 1
+
+    def remove_client(self, index):
+        """Removes the client at index from the clients list in constant time: the last client takes its place.
+        Updates the tracked matrices. Returns the removed client."""
+        self._sync()
+        clients_list = self.clients_list
+        removed_client = clients_list[index]
+        clients_list[index] = clients_list[-1]
+        clients_list.pop()
+        last = self._size - 1
+        for buffer in (self._x, self._y, self._demand, self._identifiers):
+            buffer[index] = buffer[last]
+        self._size = last
+        for tracker in self.matrix_trackers:
+            tracker.client_swap_removed(index)
+        return removed_client
 
     def print_clients(self):
         for client in self.clients_list:
@@ -308,15 +625,27 @@ class Problem:
     def clear_solutions(self):
         self.solutions_list.clear()
     
-    def generate_random_clients(self, amount=1, x=(-10000, 10000), y=(-10000, 10000), demand=(1, 100)):
-    
-        for i in range(1, amount + 1):
-            self._number_of_generated_clients += 1
-            client_i = Client("random client {}".format(self._number_of_generated_clients),
-                                ((x[1] - x[0]) * (np.random.rand(1)) + x[0])[0],
-                                ((y[1] - y[0]) * (np.random.rand(1)) + y[0])[0],
-                                (np.random.randint(demand[0], demand[1] + 1, 1))[0])
-            self.clients_list.append(client_i)
+    def generate_random_clients(self, amount=1, x=(-10000, 10000), y=(-10000, 10000), demand=(1, 100), rng=None):
+        """Appends amount clients drawn uniformly: x in [x[0], x[1]), y in [y[0], y[1]) and the demand is an integer in
+        [demand[0], demand[1]]. All the clients are drawn at once from rng, an instance of np.random.Generator or a
+        seed. Without rng, the generator is seeded from the legacy global state, so np.random.seed still makes the
+        clients reproducible."""
+        if rng is None:
+            rng = np.random.default_rng(np.random.randint(0, 2**31))
+        rng = np.random.default_rng(rng)
+        xs = rng.uniform(x[0], x[1], amount)
+        ys = rng.uniform(y[0], y[1], amount)
+        demands = rng.integers(demand[0], demand[1] + 1, amount)
+        numbers = np.arange(self._number_of_generated_clients + 1, self._number_of_generated_clients + amount + 1)
+        identifiers = np.char.add("random client ", numbers.astype(str))
+        self._number_of_generated_clients += amount
+        self._sync()
+        start = self._size
+        self._append_columns(xs, ys, demands, identifiers)
+        if self._clients_list is not None:
+            self._clients_list.extend(Client(identifier, x_i, y_i, demand_i) for identifier, x_i, y_i, demand_i in
+                                      zip(identifiers.tolist(), self._x[start:self._size].tolist(),
+                                          self._y[start:self._size].tolist(), demands.tolist()))
     
     def export_csv(self, file_name, cell_separator=";"):
         with open(file_name, "w", newline='') as f:
@@ -324,8 +653,8 @@ class Problem:
             writer.writerow(["Delivery optimization problem"])
             writer.writerow(["type", "identifier", "x", "y", "demand"])
             writer.writerow(["depot", self.depot.identifier, self.depot.x, self.depot.y])
-            for client in self.clients_list:
-                writer.writerow(["client", client.identifier, client.x, client.y, client.demand])
+            writer.writerows(["client", identifier, x, y, demand] for identifier, x, y, demand in
+                             zip(self.identifiers.tolist(), self.x.tolist(), self.y.tolist(), self.demand.tolist()))
     
     def import_csv(self, file_name, cell_separator=";"):
     # """This method reads a problem from a file in csv format.
@@ -335,12 +664,15 @@ class Problem:
             new_clients_list = list()
             for i, row in enumerate(reader):
                 if i == 0 and row[0] != "Delivery optimization problem":
-                    raise (FileExistsError, "Incorrect file type.")
+                    raise FileExistsError("Incorrect file type.")
                 if i >= 2:
                     if row[0] == "depot":
                         self.depot = Depot(row[1], float(row[2]), float(row[3]))
                     if row[0] == "client":
-                        new_clients_list.append(Client(row[1], float(row[2]), float(row[3]), int(row[4])))
+                        # a fractional demand makes export_csv write all the demands as floats ("27.0")
+                        demand = float(row[4])
+                        new_clients_list.append(Client(row[1], float(row[2]), float(row[3]),
+                                                       int(demand) if demand.is_integer() else demand))
                         if "random client" in row[1]:
                             self._number_of_generated_clients += 1
             self.clients_list = new_clients_list
\ No newline at end of file
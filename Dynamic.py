@@ -0,0 +1,202 @@
+"""Maintains the matrices and the solution of a problem whose clients come and go (new orders and cancellations).
+
+The cost and savings matrices are kept in buffers larger than needed, that grow by doubling: adding a client computes
+one row and one column, and removing a client moves the last row and column in its place (the last client takes the
+index of the removed one, see Problem.remove_client). A solution is repaired instead of being built again: a new
+client is inserted where it costs the least in a delivery that can carry it, or gets a delivery of its own, and a
+cancelled client is removed from its delivery.
+"""
+import numpy as np
+import Drone as dro
+import CostFunction as cost
+
+
+class IncrementalMatrices:
+    """Cost and savings matrices of a problem for a set of parameters, kept up to date when clients are added to or
+    removed from the problem with Problem.add_client and Problem.remove_client."""
+
+    def __init__(self, problem, parameters, initial_capacity=16):
+        self.problem = problem
+        self.parameters = parameters
+        c_matrix = cost.cost_matrix(problem, parameters)
+        self._size = len(c_matrix)  # rows of the cost matrix in use: depot and clients
+        capacity = max(initial_capacity, 2 * self._size)
+        self._costs = np.zeros((capacity, capacity))
+        self._costs[:self._size, :self._size] = c_matrix
+        self._savings = np.zeros((capacity, capacity))
+        self._savings[:self._size - 1, :self._size - 1] = cost.savings_from_cost_matrix(c_matrix)
+        problem.matrix_trackers.append(self)
+
+    def __repr__(self):
+        return "<IncrementalMatrices at {}. {} clients, capacity = {}>".format(
+            hex(id(self)), self._size - 1, len(self._costs) - 1)
+
+    @property
+    def c_matrix(self):
+        """Returns the cost matrix of the problem (a view of the buffer, valid until the next change)."""
+        return self._costs[:self._size, :self._size]
+
+    @property
+    def costs_buffer(self):
+        """Returns the whole buffer of the cost matrix: its rows and columns beyond those of the clients are not in
+        use. It is the same object until the buffer grows, so it can be kept where c_matrix would have to be fetched
+        again after every change."""
+        return self._costs
+
+    @property
+    def s_matrix(self):
+        """Returns the savings matrix of the problem (a view of the buffer, valid until the next change)."""
+        return self._savings[:self._size - 1, :self._size - 1]
+
+    def close(self):
+        """Stops tracking the changes of the problem."""
+        self.problem.matrix_trackers.remove(self)
+
+    def client_appended(self):
+        """Adds the row and the column of the last client of the problem (called by Problem.add_client)."""
+        if self._size == len(self._costs):
+            capacity = 2 * len(self._costs)
+            for name in ("_costs", "_savings"):
+                buffer = np.zeros((capacity, capacity))
+                buffer[:self._size, :self._size] = getattr(self, name)[:self._size, :self._size]
+                setattr(self, name, buffer)
+        new, points = self._size, np.arange(self._size + 1)
+        self._costs[new, :new + 1] = cost.pair_costs(self.problem, self.parameters, new, points)
+        self._costs[:new + 1, new] = cost.pair_costs(self.problem, self.parameters, points, new)
+        self._size += 1
+        # s_ik = c_i0 + c_0k - c_ik (client i is at row i + 1 of the cost matrix)
+        c_matrix = self.c_matrix
+        self._savings[new - 1, :new] = c_matrix[new, 0] + c_matrix[0, 1:] - c_matrix[new, 1:]
+        self._savings[:new, new - 1] = c_matrix[1:, 0] + c_matrix[0, new] - c_matrix[1:, new]
+        self._savings[new - 1, new - 1] = 0.
+
+    def client_swap_removed(self, index):
+        """Moves the row and the column of the last client to those of the client at index and drops them (called by
+        Problem.remove_client)."""
+        last = self._size - 1  # row of the last client in the cost matrix
+        row = index + 1
+        if row != last:
+            self._costs[row, :self._size] = self._costs[last, :self._size]
+            self._costs[:self._size, row] = self._costs[:self._size, last]
+            self._savings[index, :last] = self._savings[last - 1, :last]
+            self._savings[:last, index] = self._savings[:last, last - 1]
+        self._size -= 1
+
+
+class DynamicSolution:
+    """Solution of a problem repaired when clients are added or removed (see the module docstring). If no solution is
+    given, the problem is solved with the Clarke and Wright algorithm first and the solution is appended to its
+    solutions list. The deliveries read their costs from the buffer of the tracked cost matrix (see
+    IncrementalMatrices.costs_buffer), which they are given again only when it grows. The position of every delivery in
+    the deliveries list is kept, so that an empty delivery is dropped by moving the last one in its place."""
+
+    def __init__(self, problem, parameters, solution=None, version="parallel"):
+        self.problem = problem
+        self.parameters = parameters
+        self.matrices = IncrementalMatrices(problem, parameters)
+        if solution is None:
+            init = cost.positive_savings_pairs(self.matrices.s_matrix)
+            deliveries_list = cost.build_deliveries(problem, parameters, version, *init,
+                                                    c_matrix=self.matrices.c_matrix)
+            solution = dro.Solution("dynamic " + version + " Clarke and Wright. Drone capacity = {}".format(
+                parameters.drone.capacity), deliveries_list, parameters)
+            problem.solutions_list.append(solution)
+        self.solution = solution
+        index_of = None
+        self.delivery_of = dict()  # client -> delivery that serves it
+        self._positions = dict()  # delivery -> its index in the deliveries list
+        for position, delivery in enumerate(solution.deliveries_list):
+            self._positions[delivery] = position
+            if delivery.route.indices is None:
+                if index_of is None:
+                    index_of = {id(client): i for i, client in enumerate(problem.clients_list)}
+                delivery.route.indices = np.array([index_of[id(client)] for client in delivery.clients_list],
+                                                  dtype=np.int32)
+            for client in delivery.clients_list:
+                self.delivery_of[client] = delivery
+        self._buffer = None
+        self._refresh_matrices()
+
+    def _refresh_matrices(self):
+        # gives the cost buffer to all the deliveries if it was reallocated
+        if self.matrices.costs_buffer is not self._buffer:
+            self._buffer = self.matrices.costs_buffer
+            for delivery in self.solution.deliveries_list:
+                delivery.c_matrix = self._buffer
+
+    def _append_delivery(self, delivery):
+        delivery.c_matrix = self._buffer
+        self._positions[delivery] = len(self.solution.deliveries_list)
+        self.solution.deliveries_list.append(delivery)
+
+    def _drop_delivery(self, delivery):
+        deliveries_list = self.solution.deliveries_list
+        position = self._positions.pop(delivery)
+        last = deliveries_list.pop()
+        if last is not delivery:
+            deliveries_list[position] = last
+            self._positions[last] = position
+
+    def _set_route(self, delivery, clients_list, indices):
+        delivery.route = dro.Route(clients_list, delivery.depot, np.asarray(indices, dtype=np.int32))
+
+    def add_client(self, client):
+        """Adds client to the problem and inserts it in the solution where it costs the least: between two stops of a
+        delivery that can carry it, or in a new delivery (if it can not be delivered at all, it is left out).
+        Returns the delivery that serves it, or None."""
+        index = self.problem.add_client(client)
+        c_matrix = self.matrices.c_matrix
+        row = index + 1
+        capacity = self.parameters.drone.capacity
+        self._refresh_matrices()
+        if client.demand > capacity:
+            return None
+        # insertion places: the arcs (u, v) of the deliveries that can carry the client
+        candidates = [delivery for delivery in self.solution.deliveries_list
+                      if delivery.total_demand + client.demand <= capacity]
+        best_delta, best_delivery, best_position = c_matrix[0, row] + c_matrix[row, 0], None, None
+        if candidates:
+            stops = [np.concatenate(([0], delivery.route.indices + 1, [0])) for delivery in candidates]
+            u = np.concatenate([route_stops[:-1] for route_stops in stops])
+            v = np.concatenate([route_stops[1:] for route_stops in stops])
+            delta = c_matrix[u, row] + c_matrix[row, v] - c_matrix[u, v]
+            arc = int(np.argmin(delta))
+            if delta[arc] < best_delta:
+                arcs_per_delivery = np.cumsum([len(route_stops) - 1 for route_stops in stops])
+                number = int(np.searchsorted(arcs_per_delivery, arc, side="right"))
+                best_delta, best_delivery = delta[arc], candidates[number]
+                best_position = arc - (arcs_per_delivery[number - 1] if number > 0 else 0)
+        if best_delivery is None:
+            best_delivery = dro.Delivery(dro.Route([client], self.problem.depot, np.array([index], dtype=np.int32)),
+                                         self.parameters)
+            self._append_delivery(best_delivery)
+        else:
+            clients_list = best_delivery.clients_list
+            indices = best_delivery.route.indices
+            self._set_route(best_delivery, clients_list[:best_position] + [client] + clients_list[best_position:],
+                            np.insert(indices, best_position, index))
+        self.delivery_of[client] = best_delivery
+        return best_delivery
+
+    def remove_client(self, client):
+        """Removes client from its delivery (the delivery is dropped if it becomes empty) and from the problem."""
+        delivery = self.delivery_of.pop(client, None)
+        if delivery is None:  # a client that is not delivered
+            index = next(i for i, other in enumerate(self.problem.clients_list) if other is client)
+        else:
+            position = next(i for i, other in enumerate(delivery.clients_list) if other is client)
+            index = int(delivery.route.indices[position])
+            if len(delivery.clients_list) == 1:
+                self._drop_delivery(delivery)
+            else:
+                self._set_route(delivery, delivery.clients_list[:position] + delivery.clients_list[position + 1:],
+                                np.delete(delivery.route.indices, position))
+        last = self.problem.number_of_clients - 1
+        self.problem.remove_client(index)
+        if index != last:
+            # the last client of the problem now has the index of the removed one
+            moved_delivery = self.delivery_of.get(self.problem.clients_list[index])
+            if moved_delivery is not None:
+                indices = moved_delivery.route.indices.copy()  # a new array, so that the cached cost is evaluated again
+                indices[indices == last] = index
+                moved_delivery.route.indices = indices
@@ -0,0 +1,100 @@
+"""Implements a Clarke and Wright algorithm for a heterogeneous fleet of drones.
+
+Every client starts in its own route. Routes are merged end to start, following the pairs of clients in descending
+order of their best savings over the drone types, as long as the merge lowers the total cost. Each route is flown by
+the drone type that serves it most cheaply among those that can carry its total demand. The cost of every route for
+every drone type is updated in constant time from the cost matrices of the drones.
+"""
+import numpy as np
+import Drone as dro
+import CostFunction as cost
+
+
+def fleet_parameters(drones, wind, cost_func=cost.cost_b):
+    """Returns the list of the instances of DeliveryParameters of the drones for a given wind and cost function."""
+    return [dro.DeliveryParameters(drone, wind, cost_func) for drone in drones]
+
+
+def fleet_build_deliveries(problem, parameters_list, c_matrices):
+    """Returns a list of deliveries serving the clients of problem with a mix of drones. parameters_list holds the
+    parameters of each drone type and c_matrices their cost matrices for problem. Every delivery uses the parameters
+    and the cost matrix of the drone type that flies it (the same object for all the deliveries of a drone type, so
+    that they can still be merged in constant time, see CostFunction.merge_deliveries). Clients that no drone can
+    carry are not delivered."""
+    nb_clients = problem.number_of_clients
+    capacities = np.array([parameters.drone.capacity for parameters in parameters_list], dtype=float)
+    demands = problem.demand.tolist()
+    c_matrices = list(c_matrices)  # not stacked: the deliveries keep the matrices themselves, not copies
+    to_depot = np.array([c_matrix[1:, 0] for c_matrix in c_matrices])  # (drone type, client)
+    from_depot = np.array([c_matrix[0, 1:] for c_matrix in c_matrices])
+
+    def best_cost(route_demand, route_costs):
+        # cheapest cost of a route among the drone types that can carry it, inf if there are none
+        return np.where(capacities >= route_demand, route_costs, np.inf).min()
+
+    # every client is a route of its own: [first client, last client, total demand, costs per drone type, best cost]
+    routes = dict()
+    head = dict()
+    tail = dict()
+    successor = dict()
+    for i in range(nb_clients):
+        route_costs = from_depot[:, i] + to_depot[:, i]
+        route_best_cost = best_cost(demands[i], route_costs)
+        if np.isfinite(route_best_cost):
+            routes[i] = [i, i, demands[i], route_costs, route_best_cost]
+            head[i] = tail[i] = i
+
+    # pairs sorted by their best savings over the drone types
+    s_matrix = cost.savings_from_cost_matrix(c_matrices[0])
+    for c_matrix in c_matrices[1:]:
+        np.maximum(s_matrix, cost.savings_from_cost_matrix(c_matrix), out=s_matrix)
+    _, client_pairs = cost.positive_savings_pairs(s_matrix)
+    number = nb_clients  # numbers of the merged routes, they keep the routes in order of creation
+    for a, b in client_pairs.tolist():
+        route_a = tail.get(a)
+        route_b = head.get(b)
+        if route_a is None or route_b is None or route_a == route_b:
+            continue
+        first, _, demand_a, costs_a, best_a = routes[route_a]
+        _, last, demand_b, costs_b, best_b = routes[route_b]
+        new_demand = demand_a + demand_b
+        if new_demand > capacities.max():
+            continue
+        new_costs = costs_a + costs_b - to_depot[:, a] - from_depot[:, b] + \
+            np.array([c_matrix[a + 1, b + 1] for c_matrix in c_matrices])
+        new_best_cost = best_cost(new_demand, new_costs)
+        if new_best_cost >= best_a + best_b:
+            continue
+        del routes[route_a], routes[route_b], tail[a], head[b]
+        successor[a] = b
+        routes[number] = [first, last, new_demand, new_costs, new_best_cost]
+        head[first] = tail[last] = number
+        number += 1
+
+    deliveries_list = []
+    for first, last, route_demand, route_costs, _ in routes.values():
+        route = [first]
+        while route[-1] != last:
+            route.append(successor[route[-1]])
+        drone_type = int(np.argmin(np.where(capacities >= route_demand, route_costs, np.inf)))
+        deliveries_list.extend(cost.routes_to_deliveries(problem, parameters_list[drone_type], [route],
+                                                         c_matrices[drone_type]))
+    return deliveries_list
+
+
+def fleet_clarke_and_wright(problem, drones, wind, cost_func=cost.cost_b, name=None, cache=None):
+    """Solves a problem with a heterogeneous fleet of drones (list of instances of Drone). Creates a solution where
+    each delivery has the parameters of the drone that flies it, appends it to the end of the solutions list of the
+    problem and returns it. The parameters of the solution itself have no drone (drone is None).
+    cache: optional instance of MatrixCache.MatrixCache where the cost matrices are looked up."""
+    parameters_list = fleet_parameters(drones, wind, cost_func)
+    if cache is not None:
+        c_matrices = [cache.cost_matrix(problem, parameters) for parameters in parameters_list]
+    else:
+        c_matrices = [cost.cost_matrix(problem, parameters) for parameters in parameters_list]
+    if name is None:
+        name = "Fleet Clarke and Wright. Drone capacities = {}".format([drone.capacity for drone in drones])
+    deliveries_list = fleet_build_deliveries(problem, parameters_list, c_matrices)
+    solution = dro.Solution(name, deliveries_list, dro.DeliveryParameters(None, wind, cost_func))
+    problem.solutions_list.append(solution)
+    return solution
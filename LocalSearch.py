@@ -0,0 +1,307 @@
+"""Implements a local search that improves the solutions given by the Clarke and Wright algorithm.
+
+Four kinds of moves are tried:
+- "2-opt": reversal of a segment of a route,
+- "or-opt": move of a segment of 1 to 3 consecutive clients to another place of the same route,
+- "relocate": move of a client to another route,
+- "swap": exchange of two clients of different routes.
+The variation of cost of a move is read from the cost matrices (which are not symmetric when there is wind) in
+constant time, and the total demand of every route is kept up to date, so that capacity checks are constant time too.
+Only moves that lower the cost are applied. The search stops when no move improves the solution, or when its time or
+iteration budget is spent.
+"""
+import time
+import numpy as np
+import Drone as dro
+import CostFunction as cost
+
+MOVES = ("2-opt", "or-opt", "relocate", "swap")
+_EPSILON = 1e-9  # smallest relative cost improvement for a move to be applied
+
+
+class _SearchState:
+    """Routes of a solution as lists of rows of their cost matrix (row 0 is the depot, row i + 1 is client i)."""
+
+    def __init__(self, solution, problem=None, c_matrix=None):
+        self.routes = []
+        self.parameters = []
+        self.matrices = []
+        self.capacities = []
+        self.demands = []
+        self.depot = None
+        self.clients = dict()  # row -> client
+        self.route_of = dict()  # row -> number of its route
+        computed_matrices = dict()  # id(parameters) -> cost matrix computed for problem
+        index_of = None
+        for delivery in solution.deliveries_list:
+            if delivery.route.indices is not None:
+                indices = delivery.route.indices
+            else:
+                if index_of is None:
+                    index_of = {id(client): i for i, client in enumerate(problem.clients_list)}
+                indices = [index_of[id(client)] for client in delivery.clients_list]
+            matrix = delivery.c_matrix
+            if matrix is None:
+                matrix = c_matrix
+            if matrix is None:
+                if id(delivery.parameters) not in computed_matrices:
+                    computed_matrices[id(delivery.parameters)] = cost.cost_matrix(problem, delivery.parameters)
+                matrix = computed_matrices[id(delivery.parameters)]
+            rows = [int(i) + 1 for i in indices]
+            self.routes.append(rows)
+            self.parameters.append(delivery.parameters)
+            self.matrices.append(matrix)
+            self.capacities.append(delivery.drone.capacity)
+            self.demands.append(delivery.total_demand)
+            self.depot = delivery.depot
+            for row, client in zip(rows, delivery.clients_list):
+                self.clients[row] = client
+                self.route_of[row] = len(self.routes) - 1
+        self.row_demand = {row: client.demand for row, client in self.clients.items()}
+        self._groups = None
+
+    def route_cost(self, r):
+        rows = [0] + self.routes[r] + [0]
+        return self.matrices[r][rows[:-1], rows[1:]].sum()
+
+    def changed(self):
+        self._groups = None
+
+    def groups(self):
+        """Returns, for every cost matrix, numpy arrays describing the clients and the insertion places of the routes
+        that use it. They are rebuilt only after a move has been applied."""
+        if self._groups is None:
+            groups = dict()
+            for r, rows in enumerate(self.routes):
+                if not rows:
+                    continue
+                group = groups.setdefault(id(self.matrices[r]), {"matrix": self.matrices[r], "rows": [], "prev": [],
+                                                                 "next": [], "route": [], "position": []})
+                for position, row in enumerate(rows):
+                    group["rows"].append(row)
+                    group["prev"].append(rows[position - 1] if position > 0 else 0)
+                    group["next"].append(rows[position + 1] if position + 1 < len(rows) else 0)
+                    group["route"].append(r)
+                    group["position"].append(position)
+            for group in groups.values():
+                for key in ("rows", "prev", "next", "route", "position"):
+                    group[key] = np.array(group[key], dtype=np.int64)
+                routes = group["route"]
+                group["slack"] = np.array(self.capacities)[routes] - np.array(self.demands)[routes]
+                group["demand"] = np.array([self.row_demand[row] for row in group["rows"].tolist()])
+                # insertion places: before each client (arc prev -> client), or at the end of each route
+                is_last = group["next"] == 0
+                group["arc_u"] = np.concatenate((group["prev"], group["rows"][is_last]))
+                group["arc_v"] = np.concatenate((group["rows"], np.zeros(is_last.sum(), dtype=np.int64)))
+                group["arc_route"] = np.concatenate((routes, routes[is_last]))
+                group["arc_position"] = np.concatenate((group["position"], group["position"][is_last] + 1))
+                group["arc_slack"] = np.array(self.capacities)[group["arc_route"]] - \
+                    np.array(self.demands)[group["arc_route"]]
+            self._groups = list(groups.values())
+        return self._groups
+
+    def locate(self, row):
+        r = self.route_of[row]
+        return r, self.routes[r].index(row)
+
+    def to_solution(self, name, solution_parameters):
+        deliveries_list = []
+        for r, rows in enumerate(self.routes):
+            if rows:
+                indices = np.array(rows, dtype=np.int32) - 1
+                route = dro.Route([self.clients[row] for row in rows], self.depot, indices)
+                deliveries_list.append(dro.Delivery(route, self.parameters[r], self.matrices[r]))
+        return dro.Solution(name, deliveries_list, solution_parameters)
+
+
+def best_two_opt(rows, c_matrix):
+    """Returns (delta, i, j) for the best reversal of the segment rows[i:j] of a route, or None. The costs of the
+    reversed segments are obtained from prefix sums of the forward and backward costs of the route."""
+    m = len(rows)
+    if m < 2:
+        return None
+    s = np.array([0] + rows + [0])
+    forward = c_matrix[s[:-1], s[1:]]  # forward[u] = c(s_u, s_u+1)
+    backward = c_matrix[s[1:], s[:-1]]  # backward[u] = c(s_u+1, s_u)
+    prefix_forward = np.concatenate(([0.], np.cumsum(forward)))
+    prefix_backward = np.concatenate(([0.], np.cumsum(backward)))
+    a, b = np.triu_indices(m, k=1)
+    i, j = a + 1, b + 1  # the segment s_i ... s_j is reversed
+    delta = c_matrix[s[i - 1], s[j]] + c_matrix[s[i], s[j + 1]] - forward[i - 1] - forward[j] + \
+        (prefix_backward[j] - prefix_backward[i]) - (prefix_forward[j] - prefix_forward[i])
+    best = int(np.argmin(delta))
+    return delta[best], int(a[best]), int(b[best]) + 1
+
+
+def best_or_opt(rows, c_matrix, max_length=3):
+    """Returns (delta, i, length, k) for the best move of the segment rows[i:i + length] of a route to the place
+    between s_k and s_k+1 of the route s = [depot] + rows + [depot], or None."""
+    m = len(rows)
+    s = np.array([0] + rows + [0])
+    best = None
+    for length in range(1, min(max_length, m - 1) + 1):
+        for i in range(1, m - length + 2):  # the segment is s_i ... s_i+length-1
+            first, last = s[i], s[i + length - 1]
+            removal = c_matrix[s[i - 1], s[i + length]] - c_matrix[s[i - 1], first] - c_matrix[last, s[i + length]]
+            k = np.concatenate((np.arange(0, i - 1), np.arange(i + length, m + 1)))
+            if len(k) == 0:
+                continue
+            delta = removal + c_matrix[s[k], first] + c_matrix[last, s[k + 1]] - c_matrix[s[k], s[k + 1]]
+            position = int(np.argmin(delta))
+            if best is None or delta[position] < best[0]:
+                best = (delta[position], i - 1, length, int(k[position]))
+    return best
+
+
+def _removal_delta(state, r, position):
+    rows = state.routes[r]
+    row = rows[position]
+    previous_row = rows[position - 1] if position > 0 else 0
+    next_row = rows[position + 1] if position + 1 < len(rows) else 0
+    c_matrix = state.matrices[r]
+    return previous_row, next_row, \
+        c_matrix[previous_row, next_row] - c_matrix[previous_row, row] - c_matrix[row, next_row]
+
+
+def best_relocate(state, r, position):
+    """Returns (delta, target route, target position) for the best move of the client at position of route r to
+    another route that can carry it, or None."""
+    row = state.routes[r][position]
+    demand = state.row_demand[row]
+    _, _, removal = _removal_delta(state, r, position)
+    best = None
+    for group in state.groups():
+        c_matrix = group["matrix"]
+        u, v, routes = group["arc_u"], group["arc_v"], group["arc_route"]
+        fits = (routes != r) & (group["arc_slack"] >= demand)
+        if not fits.any():
+            continue
+        delta = np.where(fits, removal + c_matrix[u, row] + c_matrix[row, v] - c_matrix[u, v], np.inf)
+        k = int(np.argmin(delta))
+        if best is None or delta[k] < best[0]:
+            best = (delta[k], int(routes[k]), int(group["arc_position"][k]))
+    return best
+
+
+def best_swap(state, r, position):
+    """Returns (delta, other route, other position) for the best exchange of the client at position of route r with
+    a client of another route, capacities being respected, or None."""
+    row = state.routes[r][position]
+    demand = state.row_demand[row]
+    previous_row, next_row, removal = _removal_delta(state, r, position)
+    c_a = state.matrices[r]
+    removal -= c_a[previous_row, next_row]  # the client is replaced, its neighbours are not linked together
+    slack_a = state.capacities[r] - state.demands[r]
+    best = None
+    for group in state.groups():
+        c_b = group["matrix"]
+        rows, prev, nxt = group["rows"], group["prev"], group["next"]
+        fits = (group["route"] != r) & (group["demand"] - demand <= slack_a) & \
+            (demand - group["demand"] <= group["slack"])
+        if not fits.any():
+            continue
+        delta = removal + c_a[previous_row, rows] + c_a[rows, next_row] + \
+            c_b[prev, row] + c_b[row, nxt] - c_b[prev, rows] - c_b[rows, nxt]
+        delta = np.where(fits, delta, np.inf)
+        k = int(np.argmin(delta))
+        if best is None or delta[k] < best[0]:
+            best = (delta[k], int(group["route"][k]), int(group["position"][k]))
+    return best
+
+
+def improve_solution(solution, problem=None, c_matrix=None, moves=MOVES, time_limit=None, max_iterations=None,
+                     name=None):
+    """Improves solution with a local search (see the module docstring) and returns the improved solution (solution
+    itself is not modified).
+    The deliveries use their own cost matrix (see class Delivery) if they have one, c_matrix otherwise, or the cost
+    matrix of problem for their parameters. problem is also needed if the routes do not know the indices of their
+    clients.
+    :param moves: kinds of moves to try, among MOVES
+    :param time_limit: optional maximum duration of the search (in seconds)
+    :param max_iterations: optional maximum number of moves applied
+    :return: instance of class Solution, with an attribute local_search_report (dictionary with the number of moves
+    applied of each kind, the costs before and after the search and its duration)."""
+    start = time.perf_counter()
+    deadline = None if time_limit is None else start + time_limit
+    state = _SearchState(solution, problem, c_matrix)
+    initial_cost = sum(state.route_cost(r) for r in range(len(state.routes)))
+    epsilon = _EPSILON * max(abs(initial_cost), 1.)
+    applied = {move: 0 for move in MOVES}
+    iterations = 0
+
+    def budget_left():
+        return (deadline is None or time.perf_counter() < deadline) and \
+            (max_iterations is None or iterations < max_iterations)
+
+    improved = True
+    while improved and budget_left():
+        improved = False
+        for r in range(len(state.routes)):
+            if "2-opt" in moves and budget_left():
+                best = best_two_opt(state.routes[r], state.matrices[r])
+                if best is not None and best[0] < -epsilon:
+                    _, i, j = best
+                    state.routes[r][i:j] = state.routes[r][i:j][::-1]
+                    applied["2-opt"] += 1
+                    iterations += 1
+                    improved = True
+                    state.changed()
+            if "or-opt" in moves and budget_left():
+                best = best_or_opt(state.routes[r], state.matrices[r])
+                if best is not None and best[0] < -epsilon:
+                    _, i, length, k = best
+                    rows = state.routes[r]
+                    segment = rows[i:i + length]
+                    # k is a place in the route before the segment was removed
+                    rest = rows[:i] + rows[i + length:]
+                    insertion = k if k < i else k - length
+                    state.routes[r] = rest[:insertion] + segment + rest[insertion:]
+                    applied["or-opt"] += 1
+                    iterations += 1
+                    improved = True
+                    state.changed()
+        for row in list(state.clients):
+            if not budget_left():
+                break
+            r, position = state.locate(row)
+            candidates = []
+            if "relocate" in moves:
+                candidates.append(("relocate", best_relocate(state, r, position)))
+            if "swap" in moves:
+                candidates.append(("swap", best_swap(state, r, position)))
+            candidates = [(best[0], move, best) for move, best in candidates if best is not None]
+            if not candidates:
+                continue
+            delta, move, best = min(candidates, key=lambda candidate: candidate[0])
+            if delta >= -epsilon:
+                continue
+            _, other_r, other_position = best
+            demand = state.row_demand[row]
+            if move == "relocate":
+                state.routes[r].pop(position)
+                state.routes[other_r].insert(other_position, row)
+                state.demands[r] -= demand
+                state.demands[other_r] += demand
+                state.route_of[row] = other_r
+            else:
+                other_row = state.routes[other_r][other_position]
+                other_demand = state.row_demand[other_row]
+                state.routes[r][position] = other_row
+                state.routes[other_r][other_position] = row
+                state.demands[r] += other_demand - demand
+                state.demands[other_r] += demand - other_demand
+                state.route_of[row] = other_r
+                state.route_of[other_row] = r
+            applied[move] += 1
+            iterations += 1
+            improved = True
+            state.changed()
+
+    if name is None:
+        name = solution.name + " + local search"
+    improved_solution = state.to_solution(name, solution.parameters)
+    improved_solution.local_search_report = {
+        "moves": applied, "iterations": iterations, "initial_cost": initial_cost,
+        "final_cost": sum(state.route_cost(r) for r in range(len(state.routes))),
+        "time": time.perf_counter() - start}
+    return improved_solution
@@ -0,0 +1,131 @@
+"""Implements a cache for the cost and savings matrices of the problems.
+
+The matrices are identified by a content hash of the coordinates of the depot and of the clients, of the speed and
+the acd of the drone, of the wind and of the cost function. The capacity of the drone does not change the matrices,
+so drones that only differ by their capacity share the same entries.
+Recently used matrices are kept in memory (least recently used ones are evicted first) and, if a directory is given,
+they are also stored on disk as .npy files so that other processes can load them (memory-mapped).
+"""
+import collections
+import hashlib
+import os
+import numpy as np
+import CostFunction as cost
+
+
+def cost_function_identity(cost_func):
+    """Returns a string that identifies a cost function across processes: its module and qualified name (and the
+    arguments of a functools.partial). The code of lambdas and local functions is hashed too, since their names are
+    not unique."""
+    func = getattr(cost_func, "func", cost_func)  # functools.partial
+    identity = "{}.{}".format(getattr(func, "__module__", ""), getattr(func, "__qualname__", repr(func)))
+    if "<" in identity and hasattr(func, "__code__"):
+        identity += ":" + hashlib.sha1(func.__code__.co_code + repr(func.__code__.co_consts).encode()).hexdigest()
+    if func is not cost_func:
+        identity += repr((getattr(cost_func, "args", ()), sorted(getattr(cost_func, "keywords", {}).items())))
+    return identity
+
+
+def wind_fingerprint(wind):
+    """Returns the bytes that identify a wind. Winds that are not uniform can provide their own fingerprint() method."""
+    if hasattr(wind, "fingerprint"):
+        return wind.fingerprint()
+    return np.array((wind.x, wind.y), dtype=float).tobytes()
+
+
+def matrix_key(problem, parameters):
+    """Returns the hexadecimal content hash that identifies the cost matrix of problem for the given parameters."""
+    digest = hashlib.sha1()
+    x, y = cost.problem_coordinates(problem)
+    digest.update(x.tobytes())
+    digest.update(y.tobytes())
+    digest.update(np.array((parameters.drone.speed, parameters.drone.acd), dtype=float).tobytes())
+    digest.update(wind_fingerprint(parameters.wind))
+    digest.update(cost_function_identity(parameters.cost_func).encode())
+    return digest.hexdigest()
+
+
+class MatrixCache:
+
+    def __init__(self, maxsize=16, max_bytes=None, directory=None, mmap_mode="r"):
+        self.maxsize = maxsize  # maximum number of matrices kept in memory
+        self.max_bytes = max_bytes  # optional maximum total size (in bytes) of the matrices kept in memory
+        self.directory = directory  # optional directory where the matrices are stored as .npy files
+        self.mmap_mode = mmap_mode  # mode used to memory-map the matrices stored on disk (None to load them)
+        self._entries = collections.OrderedDict()  # (kind, key) -> matrix, least recently used first
+        self._nbytes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    def __repr__(self):
+        return "<MatrixCache at {}. {} matrices, hits = {}, disk hits = {}, misses = {}>".format(
+            hex(id(self)), len(self._entries), self.hits, self.disk_hits, self.misses)
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def stats(self):
+        """Returns the counters of the cache in a dictionary."""
+        return {"hits": self.hits, "disk_hits": self.disk_hits, "misses": self.misses,
+                "matrices": len(self._entries), "bytes": self._nbytes}
+
+    def clear(self, counters=False):
+        """Removes all the matrices from memory (not from disk). Resets the counters if counters is True."""
+        self._entries.clear()
+        self._nbytes = 0
+        if counters:
+            self.hits = self.disk_hits = self.misses = 0
+
+    def cost_matrix(self, problem, parameters):
+        """Returns the cost matrix of problem for the given parameters (see CostFunction.cost_matrix). The returned
+        matrix is shared, it is read-only."""
+        if not parameters.cost_func:
+            return cost.cost_matrix(problem, parameters)
+        return self._get("cost", matrix_key(problem, parameters), lambda: cost.cost_matrix(problem, parameters))
+
+    def savings_matrix(self, problem, parameters):
+        """Returns the savings matrix of problem for the given parameters (see CostFunction.savings_matrix). The
+        returned matrix is shared, it is read-only."""
+        if not parameters.cost_func:
+            return cost.savings_matrix(problem, parameters)
+        return self._get("savings", matrix_key(problem, parameters),
+                         lambda: cost.savings_from_cost_matrix(self.cost_matrix(problem, parameters)))
+
+    def _path(self, kind, key):
+        return os.path.join(self.directory, "{}_{}.npy".format(kind, key))
+
+    def _get(self, kind, key, compute):
+        entry = (kind, key)
+        if entry in self._entries:
+            self.hits += 1
+            self._entries.move_to_end(entry)
+            return self._entries[entry]
+        matrix = None
+        if self.directory is not None and os.path.exists(self._path(kind, key)):
+            matrix = np.load(self._path(kind, key), mmap_mode=self.mmap_mode)
+            self.disk_hits += 1
+        if matrix is None:
+            self.misses += 1
+            matrix = compute()
+            if self.directory is not None:
+                # written to a temporary file first so that other processes never load a partial matrix
+                temporary_path = self._path(kind, key) + ".{}.tmp".format(os.getpid())
+                with open(temporary_path, "wb") as f:
+                    np.save(f, matrix)
+                os.replace(temporary_path, self._path(kind, key))
+        if isinstance(matrix, np.ndarray) and not isinstance(matrix, np.memmap):
+            matrix.flags.writeable = False
+        self._entries[entry] = matrix
+        self._nbytes += matrix.nbytes
+        self._evict()
+        return matrix
+
+    def _evict(self):
+        while self._entries and (len(self._entries) > self.maxsize or
+                                 (self.max_bytes is not None and self._nbytes > self.max_bytes)):
+            _, matrix = self._entries.popitem(last=False)
+            self._nbytes -= matrix.nbytes
@@ -0,0 +1,116 @@
+"""Runs the Clarke and Wright algorithm on many independent random problems and aggregates the results.
+
+The problems are spread over a pool of processes. Every problem has its own seed, derived from the seed of the
+experiment, so that the results do not depend on the number of processes nor on the order in which they finish.
+"""
+import concurrent.futures
+import os
+import time
+import numpy as np
+import Drone as dro
+import CostFunction as cost
+
+
+def make_tasks(n_problems, drones, winds, cost_func=cost.cost_b, version="sequential", depot=None, amount=(50, 60),
+               x=(-6000, 6000), y=(-3500, 3500), demand=(5, 60), seed=0):
+    """Returns the list of the tasks of an experiment: n_problems random problems for every couple (drone, wind).
+    amount is either a number of clients or a couple (low, high) from which the number of clients is drawn (high
+    excluded, like np.random.randint). x, y and demand are passed to Problem.generate_random_clients."""
+    if depot is None:
+        depot = dro.Depot()
+    seeds = np.random.SeedSequence(seed).spawn(n_problems * len(drones) * len(winds))
+    tasks = []
+    for i_drone, drone in enumerate(drones):
+        for i_wind, wind in enumerate(winds):
+            for i in range(n_problems):
+                tasks.append({"index": len(tasks), "seed": int(seeds[len(tasks)].generate_state(1)[0]),
+                              "drone_index": i_drone, "drone": drone, "wind_index": i_wind, "wind": wind,
+                              "cost_func": cost_func, "version": version, "depot": depot, "amount": amount,
+                              "x": x, "y": y, "demand": demand})
+    return tasks
+
+
+def solve_task(task):
+    """Generates and solves the random problem described by task (see make_tasks). Returns a dictionary of results."""
+    rng = np.random.default_rng(task["seed"])
+    amount = task["amount"]
+    if not np.isscalar(amount):
+        amount = rng.integers(*amount)
+    problem = dro.Problem(task["depot"])
+    problem.generate_random_clients(amount=int(amount), x=task["x"], y=task["y"], demand=task["demand"], rng=rng)
+    parameters = dro.DeliveryParameters(task["drone"], task["wind"], task["cost_func"])
+    start = time.perf_counter()
+    cost.clarke_and_wright(problem, parameters, version=task["version"], verbose=False)
+    elapsed = time.perf_counter() - start
+    solution = problem.solutions_list[-1]
+    total_cost, total_savings = solution.cost_and_savings()
+    return {"index": task["index"], "seed": task["seed"], "drone_index": task["drone_index"],
+            "wind_index": task["wind_index"], "version": task["version"], "clients": int(amount),
+            "cost": float(total_cost), "savings": float(total_savings),
+            "savings_ratio": float(total_savings / (total_savings + total_cost)) if total_cost else 0.,
+            "routes": len(solution.deliveries_list), "time": elapsed}
+
+
+def iter_experiments(tasks, workers=None, max_pending=None):
+    """Solves the tasks and yields their results as soon as they are available (in no particular order).
+    workers is the number of processes (os.cpu_count() by default). With workers=1, the tasks are solved in this
+    process. At most max_pending tasks (4 per process by default) are submitted to the pool at the same time."""
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers == 1:
+        for task in tasks:
+            yield solve_task(task)
+        return
+    if max_pending is None:
+        max_pending = 4 * workers
+    tasks = iter(tasks)
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = set()
+        task = next(tasks, None)
+        while task is not None or pending:
+            while task is not None and len(pending) < max_pending:
+                pending.add(executor.submit(solve_task, task))
+                task = next(tasks, None)
+            done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+
+
+def summarize(results, percentiles=(5, 50, 95)):
+    """Aggregates results (dictionaries returned by solve_task) by drone, wind and version. Returns a list of
+    dictionaries, one per group, with the number of problems, the overall savings ratio (total savings divided by
+    total savings plus total cost) and, for cost, savings, savings_ratio, routes and time, a dictionary of statistics
+    (mean, std, min, max and the given percentiles)."""
+    groups = dict()
+    for result in results:
+        groups.setdefault((result["drone_index"], result["wind_index"], result["version"]), []).append(result)
+    summary = []
+    for (drone_index, wind_index, version), group in sorted(groups.items()):
+        total_cost = sum(result["cost"] for result in group)
+        total_savings = sum(result["savings"] for result in group)
+        group_summary = {"drone_index": drone_index, "wind_index": wind_index, "version": version,
+                         "problems": len(group),
+                         "average_savings_ratio": total_savings / (total_savings + total_cost) if total_cost else 0.}
+        for field in ("cost", "savings", "savings_ratio", "routes", "time"):
+            values = np.array([result[field] for result in group], dtype=float)
+            statistics = {"mean": float(values.mean()), "std": float(values.std()), "min": float(values.min()),
+                          "max": float(values.max())}
+            for q, value in zip(percentiles, np.percentile(values, percentiles)):
+                statistics["p{}".format(q)] = float(value)
+            group_summary[field] = statistics
+        summary.append(group_summary)
+    return summary
+
+
+def run_experiments(n_problems, drones, winds, cost_func=cost.cost_b, version="sequential", workers=None,
+                    progress=None, **kwargs):
+    """Solves n_problems random problems for every couple (drone, wind) on a pool of processes (see make_tasks for
+    the other keyword arguments). progress is an optional function called with each result as soon as it is
+    available. Returns (results, summary) where results is sorted by task index and summary is given by summarize."""
+    results = []
+    for result in iter_experiments(make_tasks(n_problems, drones, winds, cost_func, version, **kwargs), workers):
+        if progress is not None:
+            progress(result)
+        results.append(result)
+    results.sort(key=lambda result: result["index"])
+    return results, summarize(results)
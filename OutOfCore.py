@@ -0,0 +1,168 @@
+"""Implements the Clarke and Wright algorithm with a bounded memory budget, for problems whose dense cost and savings
+matrices do not fit in memory.
+
+The cost matrix is computed by blocks of rows, and can be stored on disk (memory-mapped .npy file). The savings of
+each block of rows are computed from the cost matrix, only the positive ones are kept and they are sorted: each block
+gives a sorted run. The runs, stored on disk as well if a directory is given, are merged into a single stream of
+chunks of savings in descending order, that the build functions of CostFunction read lazily.
+Equal savings keep the row-major order of the savings matrix, so the result is the same as with the dense matrices.
+"""
+import contextlib
+import os
+import tempfile
+import numpy as np
+import Drone as dro
+import CostFunction as cost
+
+_TEMPORARIES = 6  # number of arrays of the size of a block that exist at the same time while a block is processed
+
+
+def rows_per_block(nb_columns, memory_cap):
+    """Returns the number of rows of the blocks of a matrix with nb_columns columns (float64) such that the
+    processing of a block needs about memory_cap bytes at most (at least 1 row)."""
+    return max(1, int(memory_cap // (_TEMPORARIES * 8 * max(nb_columns, 1))))
+
+
+def blocked_cost_matrix(problem, parameters, memory_cap, path=None):
+    """Returns the cost matrix of problem for the given parameters (see CostFunction.cost_matrix), computed by blocks
+    of rows so that no more than about memory_cap bytes of temporary arrays are used. If path is given, the matrix is
+    written to this .npy file and returned memory-mapped (read-only), otherwise it is returned in memory."""
+    mat_dim = problem.number_of_clients + 1
+    if path is not None:
+        c_matrix = np.lib.format.open_memmap(path, mode="w+", dtype=float, shape=(mat_dim, mat_dim))
+    else:
+        c_matrix = np.empty((mat_dim, mat_dim))
+    step = rows_per_block(mat_dim, memory_cap)
+    columns = np.arange(mat_dim)
+    for start in range(0, mat_dim, step):
+        rows = np.arange(start, min(start + step, mat_dim))
+        c_matrix[start:start + len(rows)] = cost.pair_costs(problem, parameters, rows[:, None], columns[None, :])
+    if path is not None:
+        c_matrix.flush()
+        del c_matrix
+        return np.load(path, mmap_mode="r")
+    return c_matrix
+
+
+def savings_runs(problem, parameters, memory_cap, c_matrix=None, directory=None):
+    """Returns the list of the sorted runs of positive savings of problem: one tuple (sorted_savings, client_pairs)
+    per block of rows of the savings matrix, in the form of CostFunction.positive_savings_pairs. The blocks are read
+    from c_matrix if it is given (it can be memory-mapped), otherwise their costs are computed.
+    If directory is given, the runs are written to .npy files in it and returned memory-mapped. Otherwise they are
+    kept in memory, and a MemoryError is raised if they need more than memory_cap bytes."""
+    nb_clients = problem.number_of_clients
+    clients = np.arange(1, nb_clients + 1)
+    if c_matrix is not None:
+        to_depot = np.array(c_matrix[1:, 0])
+        from_depot = np.array(c_matrix[0, 1:])
+    else:
+        to_depot = cost.pair_costs(problem, parameters, clients, 0)
+        from_depot = cost.pair_costs(problem, parameters, 0, clients)
+    step = rows_per_block(nb_clients, memory_cap)
+    runs = []
+    runs_nbytes = 0
+    for start in range(0, nb_clients, step):
+        stop = min(start + step, nb_clients)
+        if c_matrix is not None:
+            block = np.array(c_matrix[start + 1:stop + 1, 1:])
+        else:
+            block = cost.pair_costs(problem, parameters, clients[start:stop, None], clients[None, :])
+        s_block = to_depot[start:stop, None] + from_depot[None, :] - block
+        s_block[np.arange(stop - start), np.arange(start, stop)] = 0.
+        sorted_savings, client_pairs = cost.positive_savings_pairs(s_block)
+        client_pairs[:, 0] += start
+        if directory is not None:
+            savings_path = os.path.join(directory, "savings_{}.npy".format(len(runs)))
+            pairs_path = os.path.join(directory, "pairs_{}.npy".format(len(runs)))
+            np.save(savings_path, sorted_savings)
+            np.save(pairs_path, client_pairs)
+            sorted_savings = np.load(savings_path, mmap_mode="r")
+            client_pairs = np.load(pairs_path, mmap_mode="r")
+        else:
+            runs_nbytes += sorted_savings.nbytes + client_pairs.nbytes
+            if runs_nbytes > memory_cap:
+                raise MemoryError("The positive savings need more than {} bytes, give a directory to store them on "
+                                  "disk".format(memory_cap))
+        runs.append((sorted_savings, client_pairs))
+    return runs
+
+
+def merge_runs(runs, chunk_size=65536):
+    """Merges sorted runs of savings (see savings_runs) and yields chunks (sorted_savings, client_pairs) that follow
+    each other in descending order of savings. Equal savings come in the order of the runs, then in their order
+    within a run.
+    At each step, a window of about chunk_size / number of runs elements is read at the cursor of every run. The
+    elements of the windows that can not be preceded by an element that has not been read yet are sorted together
+    and yielded: those greater than the greatest last element of the windows of the runs that are not exhausted."""
+    runs = [run for run in runs if len(run[0])]
+    cursors = [0] * len(runs)
+    window = max(1, chunk_size // max(len(runs), 1))
+    while True:
+        active = [r for r in range(len(runs)) if cursors[r] < len(runs[r][0])]
+        if not active:
+            return
+        windows = [np.asarray(runs[r][0][cursors[r]:cursors[r] + window]) for r in active]
+        # runs whose window does not reach their end still hold elements lower than or equal to their last one
+        ends = [(values[-1], r) for r, values in zip(active, windows) if cursors[r] + len(values) < len(runs[r][0])]
+        if ends:
+            threshold = max(value for value, _ in ends)
+            first_run = min(r for value, r in ends if value == threshold)
+        counts = []
+        for r, values in zip(active, windows):
+            if not ends:
+                counts.append(len(values))
+            elif r <= first_run:
+                counts.append(int(np.searchsorted(-values, -threshold, side="right")))
+            else:
+                counts.append(int(np.searchsorted(-values, -threshold, side="left")))
+        savings = np.concatenate([values[:count] for values, count in zip(windows, counts)])
+        pairs = np.concatenate([np.asarray(runs[r][1][cursors[r]:cursors[r] + count])
+                                for r, count in zip(active, counts)])
+        run_numbers = np.repeat(active, counts)
+        order = np.lexsort((run_numbers, -savings))  # stable: the order within a run is kept
+        for r, count in zip(active, counts):
+            cursors[r] += count
+        yield savings[order], pairs[order]
+
+
+def blocked_clarke_and_wright(problem, parameters, version="sequential", memory_cap=2**30, directory=None,
+                              name=None, verbose=True):
+    """Solves a problem using the clarke and Wright algorithm (like CostFunction.clarke_and_wright) without building
+    the dense matrices in memory: about memory_cap bytes are used for the blocks of the matrices and the merge of
+    the savings (plus the pairs of clients with a positive saving for the sequential version, see
+    CostFunction.sequential_build_deliveries).
+    If directory is given, the cost matrix is stored in it (cost_matrix.npy), the deliveries read their costs from
+    this memory-mapped file, and the runs of savings are stored in a temporary directory in it while the problem is
+    solved (it is removed even if solving fails). Otherwise the runs of savings must fit in memory_cap and the
+    deliveries use the cost function.
+    Creates a solution, appends it to the end of the solutions list of the problem and returns it."""
+    if name is None:
+        name = version + " Clarke and Wright (blocked). Drone capacity = {}".format(parameters.drone.capacity)
+    if not parameters.cost_func:
+        deliveries_list = cost.build_deliveries(problem, parameters, version, [], [])
+    else:
+        if verbose:
+            print("Computing the savings by blocks...", end=' ', flush=True)
+        c_matrix = None
+        with contextlib.ExitStack() as stack:
+            if directory is not None:
+                os.makedirs(directory, exist_ok=True)
+                c_matrix = blocked_cost_matrix(problem, parameters, memory_cap,
+                                               os.path.join(directory, "cost_matrix.npy"))
+                runs_directory = stack.enter_context(tempfile.TemporaryDirectory(dir=directory))
+                runs = savings_runs(problem, parameters, memory_cap, c_matrix, runs_directory)
+            else:
+                runs = savings_runs(problem, parameters, memory_cap)
+            if verbose:
+                print("done !")
+                print("Building deliveries...", end=' ', flush=True)
+            chunk_size = max(1, memory_cap // (_TEMPORARIES * 16))
+            deliveries_list = cost.build_deliveries(problem, parameters, version, merge_runs(runs, chunk_size), None,
+                                                    c_matrix)
+            del runs  # the memory-mapped runs are closed before their directory is removed
+    solution = dro.Solution(name, deliveries_list, parameters)
+    problem.solutions_list.append(solution)
+    if verbose:
+        print("done !")
+        solution.print(False)
+    return solution
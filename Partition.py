@@ -0,0 +1,108 @@
+"""Implements the partitioning of the clients of a problem between two drones according to their demand.
+
+For a threshold t, the clients whose demand is lower than or equal to t are delivered by the first drone and the
+others by the second one. The cost matrix of the problem is computed once per drone, the matrix of each part is a
+submatrix of it.
+"""
+import concurrent.futures
+import os
+import numpy as np
+import Drone as dro
+import CostFunction as cost
+
+
+def sub_cost_matrix(c_matrix, indices):
+    """Returns the cost matrix of the problem made of the clients whose indices are given (and of the same depot),
+    extracted from the cost matrix c_matrix of the whole problem."""
+    rows = np.concatenate(([0], np.asarray(indices) + 1))
+    return c_matrix[np.ix_(rows, rows)]
+
+
+def solve_part(problem, parameters, c_matrix, indices, version="parallel"):
+    """Solves with Clarke and Wright the problem made of the clients of problem whose indices are given. c_matrix is
+    the cost matrix of the whole problem for parameters. Returns the list of deliveries."""
+    sub_problem = dro.Problem(problem.depot, [problem.clients_list[i] for i in indices])
+    if not parameters.cost_func:
+        return cost.build_deliveries(sub_problem, parameters, version, [], [])
+    sub_matrix = sub_cost_matrix(c_matrix, indices)
+    init = cost.clarke_and_wright_init(sub_problem, parameters, sub_matrix, as_indices=True)
+    return cost.build_deliveries(sub_problem, parameters, version, *init, c_matrix=sub_matrix)
+
+
+def evaluate_partition(problem, parameters_1, parameters_2, c_matrix_1, c_matrix_2, threshold, version="parallel"):
+    """Solves both parts of the partition of problem given by threshold and returns a dictionary with their costs,
+    savings and numbers of deliveries."""
+    demands = problem.demand
+    evaluation = {"threshold": threshold}
+    indices_1 = np.flatnonzero(demands <= threshold)
+    indices_2 = np.flatnonzero(demands > threshold)
+    for part, parameters, c_matrix, indices in ((1, parameters_1, c_matrix_1, indices_1),
+                                                (2, parameters_2, c_matrix_2, indices_2)):
+        deliveries_list = solve_part(problem, parameters, c_matrix, indices, version)
+        part_cost, part_savings = dro.Solution("", deliveries_list, parameters).cost_and_savings()
+        evaluation["clients_{}".format(part)] = len(indices)
+        evaluation["deliveries_{}".format(part)] = len(deliveries_list)
+        evaluation["cost_{}".format(part)] = part_cost
+        evaluation["savings_{}".format(part)] = part_savings
+    evaluation["cost"] = evaluation["cost_1"] + evaluation["cost_2"]
+    evaluation["savings"] = evaluation["savings_1"] + evaluation["savings_2"]
+    return evaluation
+
+
+_worker_arguments = None  # (problem, parameters_1, parameters_2, c_matrix_1, c_matrix_2, version) in the workers
+
+
+def _init_worker(*arguments):
+    global _worker_arguments
+    _worker_arguments = arguments
+
+
+def _evaluate_in_worker(threshold):
+    problem, parameters_1, parameters_2, c_matrix_1, c_matrix_2, version = _worker_arguments
+    return evaluate_partition(problem, parameters_1, parameters_2, c_matrix_1, c_matrix_2, threshold, version)
+
+
+def demand_threshold_sweep(problem, parameters_1, parameters_2, thresholds=range(5, 151), version="parallel",
+                           workers=None, cache=None):
+    """Evaluates the partitions of the clients of problem given by every threshold of thresholds (see the module
+    docstring) and returns the cost curve: a list of dictionaries (see evaluate_partition), one per threshold, in the
+    order of thresholds.
+    The cost matrix of the problem is computed once per set of parameters (or looked up in cache, an optional
+    instance of MatrixCache.MatrixCache). Thresholds that give the same partition as another one are evaluated once.
+    The partitions are evaluated by a pool of workers processes (os.cpu_count() by default, 1 to stay in this
+    process)."""
+    matrices = []
+    for parameters in (parameters_1, parameters_2):
+        if not parameters.cost_func:
+            matrices.append(None)
+        elif cache is not None:
+            matrices.append(cache.cost_matrix(problem, parameters))
+        else:
+            matrices.append(cost.cost_matrix(problem, parameters))
+    # two thresholds give the same partition if the same number of demands is lower than or equal to them
+    sorted_demands = np.sort(problem.demand)
+    thresholds = list(thresholds)
+    partition_of = {threshold: int(np.searchsorted(sorted_demands, threshold, side="right"))
+                    for threshold in thresholds}
+    representatives = dict()  # partition -> first threshold that gives it
+    for threshold in thresholds:
+        representatives.setdefault(partition_of[threshold], threshold)
+
+    arguments = (problem, parameters_1, parameters_2, matrices[0], matrices[1], version)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers == 1 or len(representatives) == 1:
+        evaluations = [evaluate_partition(*arguments[:5], threshold, version)
+                       for threshold in representatives.values()]
+    else:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                                    initargs=arguments) as executor:
+            evaluations = list(executor.map(_evaluate_in_worker, representatives.values()))
+    evaluation_of = {partition_of[evaluation["threshold"]]: evaluation for evaluation in evaluations}
+
+    curve = []
+    for threshold in thresholds:
+        evaluation = dict(evaluation_of[partition_of[threshold]])
+        evaluation["threshold"] = threshold
+        curve.append(evaluation)
+    return curve
@@ -0,0 +1,139 @@
+"""Reads and writes problems in bulk, as numpy columns instead of one Client object per line.
+
+Two formats are supported:
+- the csv format of Problem.export_csv ("Delivery optimization problem" title, header, then one "depot" or "client"
+row per point, separated by ';'), parsed with a single np.loadtxt and written the way csv.writer writes it, so that
+a file read and written again is unchanged,
+- a binary format: a .npy file holding a structured array with one record per point (kind, identifier, x, y, demand),
+the depot first. It can be memory-mapped, so that loading it does not depend on the number of clients.
+The columns of a problem are given in a dictionary: "depot" (instance of Depot), "identifiers" (numpy array of
+strings), "x", "y" (float arrays) and "demand" (integer array, or float array if a demand is fractional).
+"""
+import numpy as np
+import Drone as dro
+
+TITLE = "Delivery optimization problem"
+DEPOT, CLIENT = 0, 1  # values of the field 'kind' of the binary format
+
+
+def problem_columns(problem):
+    """Returns the columns of problem (see the module docstring), copies of the columns of the problem."""
+    return {"depot": problem.depot, "identifiers": problem.identifiers.copy(), "x": problem.x.copy(),
+            "y": problem.y.copy(), "demand": problem.demand.copy()}
+
+
+def problem_from_columns(columns):
+    """Returns a new instance of Problem made of the columns (see the module docstring). The instances of Client are
+    only created if the clients list of the problem is used."""
+    problem = dro.Problem(columns["depot"])
+    problem.set_columns(columns["x"], columns["y"], columns["demand"], columns["identifiers"])
+    # like Problem.import_csv, the clients that were randomly generated are counted
+    problem._number_of_generated_clients = int(np.count_nonzero(
+        np.char.find(columns["identifiers"].astype(str), "random client") >= 0))
+    return problem
+
+
+def read_csv_columns(file_name, cell_separator=";"):
+    """Reads a problem written by Problem.export_csv and returns its columns (see the module docstring)."""
+    with open(file_name, newline='') as f:
+        return parse_csv_columns(f.read(), cell_separator)
+
+
+def parse_csv_columns(text, cell_separator=";"):
+    """Returns the columns (see the module docstring) of a problem given as text in the csv format of
+    Problem.export_csv."""
+    lines = text.splitlines()
+    if not lines or lines[0].split(cell_separator)[0] != TITLE:
+        raise FileExistsError("Incorrect file type.")
+    depot = None
+    depot_lines = [line for line in lines[2:] if line.startswith("depot" + cell_separator)]
+    if depot_lines:
+        # the coordinates keep their type (as Problem.export_csv wrote them), so that they are written back unchanged
+        _, identifier, x, y = np.loadtxt(depot_lines[-1:], delimiter=cell_separator, usecols=(0, 1, 2, 3), dtype=str,
+                                         quotechar='"').tolist()
+        depot = dro.Depot(identifier, _number(x), _number(y))
+    client_lines = [line for line in lines[2:] if line.startswith("client" + cell_separator)]
+    if not client_lines:
+        return {"depot": depot, "identifiers": np.array([], dtype=str), "x": np.array([]), "y": np.array([]),
+                "demand": np.array([], dtype=np.int64)}
+    # an identifier is not longer than its line
+    dtype = [("identifier", "U{}".format(max(map(len, client_lines)))), ("x", float), ("y", float), ("demand", float)]
+    values = np.loadtxt(client_lines, delimiter=cell_separator, usecols=(1, 2, 3, 4), dtype=dtype, ndmin=1,
+                        quotechar='"')
+    identifiers = values["identifier"]
+    identifiers = identifiers.astype("U{}".format(max(int(np.char.str_len(identifiers).max()), 1)))
+    demand = values["demand"]
+    if np.isfinite(demand).all() and (demand == np.floor(demand)).all():
+        demand = demand.astype(np.int64)
+    return {"depot": depot, "identifiers": identifiers, "x": values["x"].copy(), "y": values["y"].copy(),
+            "demand": demand}
+
+
+def _number(text):
+    # int if text is written as an integer, float otherwise
+    try:
+        return int(text)
+    except ValueError:
+        return float(text)
+
+
+def _field(value, cell_separator):
+    # value as csv.writer writes it: floats by their repr, quoted if it holds the separator, a quote or a line break
+    text = float.__repr__(value) if isinstance(value, float) else str(value)
+    if cell_separator in text or '"' in text or "\r" in text or "\n" in text:
+        return '"' + text.replace('"', '""') + '"'
+    return text
+
+
+def read_csv(file_name, cell_separator=";"):
+    """Reads a problem written by Problem.export_csv and returns it (instance of Problem)."""
+    return problem_from_columns(read_csv_columns(file_name, cell_separator))
+
+
+def write_csv(columns, file_name, cell_separator=";"):
+    """Writes the columns of a problem in the csv format of Problem.export_csv."""
+    depot = columns["depot"]
+    with open(file_name, "w", newline='') as f:
+        f.write(TITLE + "\r\n")
+        f.write(cell_separator.join(["type", "identifier", "x", "y", "demand"]) + "\r\n")
+        f.write(cell_separator.join(["depot"] + [_field(value, cell_separator)
+                                                 for value in (depot.identifier, depot.x, depot.y)]) + "\r\n")
+        row = cell_separator.join(["client", "{}", "{!r}", "{!r}", "{!r}"]) + "\r\n"
+        identifiers = [_field(identifier, cell_separator) for identifier in columns["identifiers"].tolist()]
+        f.writelines(row.format(*values) for values in zip(identifiers, columns["x"].tolist(), columns["y"].tolist(),
+                                                           columns["demand"].tolist()))
+
+
+def binary_dtype(identifier_length, demand_type=np.int64):
+    """Returns the dtype of the records of the binary format for identifiers of identifier_length characters and
+    demands of type demand_type (np.int64, or float for fractional demands)."""
+    return np.dtype([("kind", np.int8), ("identifier", "U{}".format(max(identifier_length, 1))), ("x", float),
+                     ("y", float), ("demand", demand_type)])
+
+
+def save_binary(columns, file_name):
+    """Writes the columns of a problem in the binary format (a .npy file, see the module docstring)."""
+    depot = columns["depot"]
+    identifiers = columns["identifiers"].astype(str)
+    length = max(len(depot.identifier), identifiers.dtype.itemsize // 4)
+    demand_type = float if np.asarray(columns["demand"]).dtype.kind == "f" else np.int64
+    records = np.empty(len(identifiers) + 1, dtype=binary_dtype(length, demand_type))
+    records[0] = (DEPOT, depot.identifier, depot.x, depot.y, 0)
+    records["kind"][1:] = CLIENT
+    records["identifier"][1:] = identifiers
+    records["x"][1:] = columns["x"]
+    records["y"][1:] = columns["y"]
+    records["demand"][1:] = columns["demand"]
+    np.save(file_name, records)
+
+
+def load_binary(file_name, mmap_mode="r"):
+    """Reads a problem written by save_binary and returns its columns (see the module docstring). With a mmap_mode,
+    the columns are views of the memory-mapped file: nothing is read before it is used."""
+    records = np.load(file_name, mmap_mode=mmap_mode)
+    if len(records) == 0 or records["kind"][0] != DEPOT:
+        raise FileExistsError("Incorrect file type.")
+    depot = dro.Depot(str(records["identifier"][0]), float(records["x"][0]), float(records["y"][0]))
+    clients = records[1:]
+    return {"depot": depot, "identifiers": clients["identifier"], "x": clients["x"], "y": clients["y"],
+            "demand": clients["demand"]}
@@ -0,0 +1,99 @@
+"""Opt-in instrumentation of the hot paths of the solvers: counters of events and timings of the phases of the Clarke
+and Wright algorithm.
+
+Profiling is disabled by default. The instrumented functions then only check that the module attribute current is
+None, once per call: the counts are made in bulk (a batch of legs, a chunk of pairs, a whole build), never once per
+pair of clients inside the loops of the builders. Profiling is enabled for a block of code with
+
+    with Profiling.profiling() as profiler:
+        ...
+    profiler.report()
+
+or for a single solve with CostFunction.clarke_and_wright(..., profile=True), which attaches the report to the
+solution (attribute profile_report).
+
+Counters:
+- cost_evaluations: legs evaluated by a cost function (one per call of cost_a or cost_b, one per element of a batch),
+- savings_pairs: pairs of clients with a positive saving, sorted for Clarke and Wright,
+- merge_attempts: pairs examined by the builders (and calls of merge_deliveries), merges: links actually made,
+- routes, deliveries: instances of Route and Delivery created.
+Phases (they can nest, their times are inclusive): cost_matrix, savings_matrix, sort_savings, sparse_savings,
+build_deliveries.
+"""
+import collections
+import contextlib
+import functools
+import time
+
+current = None  # the Profiler that records the events, None when profiling is disabled
+
+
+class Profiler:
+    """Records counters and the time spent in phases (see the module docstring)."""
+
+    def __init__(self):
+        self.counters = collections.Counter()
+        self.phase_times = collections.Counter()
+        self.phase_calls = collections.Counter()
+        self.start = time.perf_counter()
+
+    def __repr__(self):
+        return "<Profiler at {}. {} counters, {} phases>".format(hex(id(self)), len(self.counters),
+                                                                 len(self.phase_times))
+
+    def count(self, counter, amount=1):
+        self.counters[counter] += amount
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """Context manager that adds the time spent in its block to the phase name."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phase_times[name] += time.perf_counter() - start
+            self.phase_calls[name] += 1
+
+    def merge(self, other):
+        """Adds the counters and the phase times of another profiler to those of this one."""
+        self.counters.update(other.counters)
+        self.phase_times.update(other.phase_times)
+        self.phase_calls.update(other.phase_calls)
+
+    def report(self):
+        """Returns a dictionary: "counters" (name -> count), "phases" (name -> {"calls", "time"}) and "time" (the time
+        since the profiler was created)."""
+        return {"counters": dict(self.counters),
+                "phases": {name: {"calls": self.phase_calls[name], "time": self.phase_times[name]}
+                           for name in self.phase_times},
+                "time": time.perf_counter() - self.start}
+
+
+@contextlib.contextmanager
+def profiling(profiler=None):
+    """Context manager that enables profiling in its block and yields the profiler (a new one if it is not given). If
+    profiling was already enabled, the events of the block are also added to the enclosing profiler."""
+    global current
+    if profiler is None:
+        profiler = Profiler()
+    enclosing = current
+    current = profiler
+    try:
+        yield profiler
+    finally:
+        current = enclosing
+        if enclosing is not None and enclosing is not profiler:
+            enclosing.merge(profiler)
+
+
+def timed(phase):
+    """Decorator that adds the time spent in the decorated function to the phase of the current profiler."""
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if current is None:
+                return function(*args, **kwargs)
+            with current.phase(phase):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,119 @@
+"""Evaluates a solution under many uniform wind scenarios, for instance the members of a forecast ensemble.
+
+The legs of all the deliveries are gathered in arrays, and the costs of every leg under every wind are computed in
+one broadcast pass (winds x legs) with the kernel of the cost function (see CostFunction.cost_a.kernel). The winds
+are processed by blocks so that the memory used stays bounded.
+"""
+import numpy as np
+import Drone as dro
+import CostFunction as cost
+
+_ELEMENTS_PER_BLOCK = 2**22  # number of (wind, leg) costs computed at once
+
+
+def wind_vectors(winds):
+    """Returns winds (array-like of shape (W, 2) or list of instances of Wind) as a (W, 2) numpy array."""
+    if len(winds) and isinstance(winds[0], dro.Wind):
+        return np.array([(wind.x, wind.y) for wind in winds], dtype=float)
+    return np.asarray(winds, dtype=float).reshape(-1, 2)
+
+
+def _scenario_costs(kernel, drone, x_a, y_a, x_b, y_b, winds):
+    # (W, legs) costs of the legs from a to b under every wind, computed by blocks of winds
+    costs = np.empty((len(winds), len(x_a)))
+    dx, dy = x_b - x_a, y_b - y_a
+    block = max(1, _ELEMENTS_PER_BLOCK // max(len(x_a), 1))
+    for start in range(0, len(winds), block):
+        stop = start + block
+        with np.errstate(invalid="ignore"):  # cost_b is not defined for winds faster than the drone
+            costs[start:stop] = kernel(dx[None, :], dy[None, :], drone, winds[start:stop, :1], winds[start:stop, 1:])
+    return costs
+
+
+def evaluate_scenarios(solution, winds, safety_factor=2):
+    """Returns the costs and savings of solution under every wind of winds (see wind_vectors), in a dictionary:
+    - "costs", "savings": (W,) arrays of the total cost and savings of the solution for every scenario,
+    - "delivery_costs": (W, number of deliveries) array of the cost of every delivery for every scenario,
+    - "violations": (W,) boolean array, True where a delivery using cost_b would fly with a wind stronger than its
+    drone speed divided by safety_factor. The costs and savings of these scenarios are nan.
+    The deliveries are evaluated with their own drone and cost function like in Delivery.cost_and_savings, the
+    deliveries without cost function are ignored. Cost functions without kernel are called once per scenario and
+    leg."""
+    winds = wind_vectors(winds)
+    wind_speeds = np.hypot(winds[:, 0], winds[:, 1])
+    deliveries_list = [delivery for delivery in solution.deliveries_list if delivery.parameters.cost_func]
+    delivery_costs = np.zeros((len(winds), len(deliveries_list)))
+    delivery_savings = np.zeros((len(winds), len(deliveries_list)))
+    violations = np.zeros(len(winds), dtype=bool)
+
+    # deliveries are grouped by drone and cost function, each group is evaluated in one pass
+    groups = dict()
+    for number, delivery in enumerate(deliveries_list):
+        groups.setdefault((id(delivery.drone), delivery.parameters.cost_func), []).append(number)
+    for (_, cost_func), numbers in groups.items():
+        drone = deliveries_list[numbers[0]].drone
+        legs = []  # (x_a, y_a, x_b, y_b) of the legs of the routes, route after route
+        singles = []  # (x_client, y_client, x_depot, y_depot) of the clients, route after route
+        legs_per_delivery = []
+        for number in numbers:
+            delivery = deliveries_list[number]
+            route = [delivery.depot] + delivery.clients_list + [delivery.depot]
+            legs.extend((a.x, a.y, b.x, b.y) for a, b in zip(route[:-1], route[1:]))
+            singles.extend((client.x, client.y, delivery.depot.x, delivery.depot.y)
+                           for client in delivery.clients_list)
+            legs_per_delivery.append(len(route) - 1)
+        legs = np.array(legs, dtype=float).reshape(-1, 4).T
+        singles = np.array(singles, dtype=float).reshape(-1, 4).T
+        kernel = getattr(cost_func, "kernel", None)
+        if kernel is not None:
+            leg_costs = _scenario_costs(kernel, drone, *legs, winds)
+            single_costs = _scenario_costs(kernel, drone, *singles, winds) + \
+                _scenario_costs(kernel, drone, singles[2], singles[3], singles[0], singles[1], winds)
+        else:
+            def call(x_a, y_a, x_b, y_b, wind):
+                return cost_func(dro.Point("", x_a, y_a), dro.Point("", x_b, y_b), drone, dro.Wind(*wind))
+            leg_costs = np.array([[call(*leg, wind) for leg in legs.T] for wind in winds]).reshape(len(winds), -1)
+            single_costs = np.array([[call(*single, wind) + call(*single[2:], *single[:2], wind)
+                                      for single in singles.T] for wind in winds]).reshape(len(winds), -1)
+        # sums per delivery (a delivery with n clients has n + 1 legs)
+        group_costs = np.add.reduceat(leg_costs, np.concatenate(([0], np.cumsum(legs_per_delivery)[:-1])), axis=1)
+        clients_per_delivery = np.array(legs_per_delivery) - 1
+        client_starts = np.concatenate(([0], np.cumsum(clients_per_delivery)[:-1]))
+        group_singles = np.zeros((len(winds), len(numbers)))
+        non_empty = clients_per_delivery > 0
+        if non_empty.any():
+            group_singles[:, non_empty] = np.add.reduceat(single_costs, client_starts[non_empty], axis=1)
+        delivery_costs[:, numbers] = group_costs
+        # like Delivery.cost_and_savings, deliveries with a single client have no savings
+        delivery_savings[:, numbers] = np.where(clients_per_delivery > 1, group_singles - group_costs, 0.)
+        if cost_func is cost.cost_b:
+            violations |= drone.speed <= safety_factor * wind_speeds
+
+    costs = delivery_costs.sum(axis=1)
+    savings = delivery_savings.sum(axis=1)
+    costs[violations] = np.nan
+    savings[violations] = np.nan
+    delivery_costs[violations] = np.nan
+    return {"costs": costs, "savings": savings, "delivery_costs": delivery_costs, "violations": violations}
+
+
+def summarize_scenarios(evaluation, percentiles=(5, 50, 95)):
+    """Returns the statistics of an evaluation (result of evaluate_scenarios) in a dictionary: the number of
+    scenarios, the share of scenarios that violate the safety factor, the worst scenario (highest cost) and, for cost
+    and savings, a dictionary of statistics over the other scenarios (mean, std, min, max and the given
+    percentiles)."""
+    costs, savings, violations = evaluation["costs"], evaluation["savings"], evaluation["violations"]
+    summary = {"scenarios": len(costs),
+               "violation_share": float(violations.mean()) if len(costs) else 0.,
+               "worst_scenario": int(np.nanargmax(costs)) if (~violations).any() else None}
+    for field, values in (("cost", costs[~violations]), ("savings", savings[~violations])):
+        if not len(values):
+            summary[field] = None
+            continue
+        statistics = {"mean": float(values.mean()), "std": float(values.std()), "min": float(values.min()),
+                      "max": float(values.max())}
+        for q, value in zip(percentiles, np.percentile(values, percentiles)):
+            statistics["p{}".format(q)] = float(value)
+        summary[field] = statistics
+    summary["worst_cost"] = summary["cost"]["max"] if summary["cost"] else None
+    return summary
@@ -0,0 +1,279 @@
+"""Long-running local solve server: solves problems with the Clarke and Wright algorithm on request, over HTTP (TCP or
+Unix socket), without paying the start of python, the imports and the cost matrix again for every problem.
+
+API (JSON over HTTP/1.1, one request per connection):
+- POST /solve with a JSON object:
+    "problem": the problem as text in the csv format of Problem.export_csv (required),
+    "drone": {"capacity", "speed", "acd"} (defaults of Drone.Drone), "wind": {"x", "y"} (no wind by default),
+    "cost_function": "cost_a" or "cost_b" (default), "version": "sequential" or "parallel" (default),
+    "k_nearest": optional number of neighbours for sparse savings (see CostFunction.clarke_and_wright).
+  The answer holds "cost", "savings", "routes" (lists of client indices, in the order of the clients in the csv),
+  "route_costs", "clients" (number of clients), "solve_time" (seconds spent in the worker), "coalesced" (True if
+  the answer was shared with an identical request) and "worker" (process id).
+- GET /health: the status of the server and its counters.
+Errors are answered with a status 4xx or 5xx and a JSON object {"error": message}.
+
+The problems are solved by worker processes. Every worker keeps its own MatrixCache.MatrixCache, so that the cost and
+savings matrices of recent geometries (same problem, drone speed and acd, wind and cost function) are reused, and the
+requests of a geometry are always sent to the same worker so that they find its matrices. With a cache directory, the
+matrices are also shared between the workers through the disk. A worker that dies (killed, out of memory) is replaced
+by a new process and the request is tried once more; if the new worker dies too, the answer is a 503 error.
+Identical requests that arrive while the first one is being solved are not solved again: they wait for its result.
+
+Usage:
+    python Server.py --port 8765 --workers 4
+    python Server.py --unix-socket /tmp/solve.sock --cache-directory /tmp/matrices
+"""
+import argparse
+import asyncio
+import concurrent.futures
+import concurrent.futures.process
+import hashlib
+import json
+import multiprocessing
+import os
+import time
+import Drone as dro
+import CostFunction as cost
+import MatrixCache as mc
+import ProblemIO as pio
+
+COST_FUNCTIONS = {"cost_a": cost.cost_a, "cost_b": cost.cost_b}
+SAFETY_FACTOR = 2  # default safety_factor of cost_b: the drone must fly this many times faster than the wind
+VERSIONS = ("sequential", "parallel")
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 413: "Payload Too Large",
+           500: "Internal Server Error", 503: "Service Unavailable"}
+
+
+class WorkerDied(Exception):
+    """Raised when the worker process of a request died while solving it, twice."""
+
+
+_worker_cache = None  # MatrixCache of a worker process
+
+
+def _start_worker(cache_size, cache_directory):
+    global _worker_cache
+    _worker_cache = mc.MatrixCache(maxsize=cache_size, directory=cache_directory)
+
+
+def check_request(request):
+    """Raises ValueError if request (a decoded /solve request) is not valid, drone and wind included (TypeError for
+    unknown fields of the drone or the wind). The problem itself is read by the worker."""
+    if not isinstance(request, dict) or not isinstance(request.get("problem"), str):
+        raise ValueError("The request must be a JSON object with the problem as csv text in 'problem'.")
+    if request.get("cost_function", "cost_b") not in COST_FUNCTIONS:
+        raise ValueError("Unknown cost function, use one of: {}.".format(", ".join(COST_FUNCTIONS)))
+    if request.get("version", "parallel") not in VERSIONS:
+        raise ValueError("Unknown version, use one of: {}.".format(", ".join(VERSIONS)))
+    for field in ("drone", "wind"):
+        if not isinstance(request.get(field, {}), dict):
+            raise ValueError("'{}' must be a JSON object.".format(field))
+    # the cost functions check these with assertions, that python -O removes
+    drone = dro.Drone(**request.get("drone", {}))
+    wind = dro.Wind(**request.get("wind", {}))
+    if not drone.speed > 0:
+        raise ValueError("The speed of the drone must be positive.")
+    if request.get("cost_function", "cost_b") == "cost_b" and not drone.speed > SAFETY_FACTOR * wind.speed:
+        raise ValueError("With cost_b, the drone must fly more than {} times faster than the wind.".format(
+            SAFETY_FACTOR))
+
+
+def geometry_key(request):
+    """Returns the hexadecimal hash of what the matrices of a /solve request depend on: the problem, the speed and the
+    acd of the drone, the wind and the cost function (not the capacity, nor the version)."""
+    drone = request.get("drone", {})
+    return hashlib.sha1(json.dumps([request["problem"], drone.get("speed"), drone.get("acd"), request.get("wind", {}),
+                                    request.get("cost_function", "cost_b")], sort_keys=True).encode()).hexdigest()
+
+
+def solve_request(request):
+    """Solves a /solve request (see the module docstring) and returns the answer. Runs in a worker process, where the
+    matrices are looked up in the cache of the worker."""
+    start = time.perf_counter()
+    columns = pio.parse_csv_columns(request["problem"])
+    if columns["depot"] is None:
+        raise ValueError("The problem has no depot.")
+    problem = pio.problem_from_columns(columns)
+    drone = dro.Drone(**request.get("drone", {}))
+    wind = dro.Wind(**request.get("wind", {}))
+    parameters = dro.DeliveryParameters(drone, wind, COST_FUNCTIONS[request.get("cost_function", "cost_b")])
+    solution = cost.clarke_and_wright(problem, parameters, request.get("version", "parallel"), verbose=False,
+                                      cache=_worker_cache, k_nearest=request.get("k_nearest"))
+    total_cost, total_savings = solution.cost_and_savings()
+    return {"cost": float(total_cost), "savings": float(total_savings),
+            "routes": [delivery.route.indices.tolist() for delivery in solution.deliveries_list],
+            "route_costs": [float(delivery.cost()) for delivery in solution.deliveries_list],
+            "clients": problem.number_of_clients, "solve_time": time.perf_counter() - start, "worker": os.getpid()}
+
+
+class SolveServer:
+    """asyncio server that dispatches the /solve requests to a pool of worker processes (see the module docstring).
+    workers is the number of processes (os.cpu_count() by default), cache_size the number of matrices kept by every
+    worker and max_body the largest accepted request, in bytes.
+    The workers are started by a fork server where it is available (spawned otherwise), so a script that starts a
+    SolveServer must protect its main code with if __name__ == "__main__" (see the multiprocessing documentation)."""
+
+    def __init__(self, workers=None, cache_size=16, cache_directory=None, max_body=2**28):
+        self.workers = workers or os.cpu_count() or 1
+        self.cache_size = cache_size
+        self.cache_directory = cache_directory
+        self.max_body = max_body
+        self._executors = []  # one process per worker, so that a geometry is always solved by the same one
+        self._servers = []
+        self._in_flight = dict()  # key of a request -> future of its answer
+        self.counters = {"requests": 0, "solved": 0, "coalesced": 0, "errors": 0, "restarted_workers": 0}
+
+    def __repr__(self):
+        return "<SolveServer at {}. {} workers, {} requests in flight>".format(hex(id(self)), self.workers,
+                                                                             len(self._in_flight))
+
+    async def start(self, host="127.0.0.1", port=8765, unix_socket=None):
+        """Starts the worker processes and listens on host:port, or on the Unix socket unix_socket if it is given.
+        Returns the asyncio server."""
+        if not self._executors:
+            self._executors = [self._new_executor() for _ in range(self.workers)]
+            # the workers are started (and the modules imported) now rather than by the first requests
+            loop = asyncio.get_running_loop()
+            await asyncio.gather(*[loop.run_in_executor(executor, os.getpid) for executor in self._executors])
+        if unix_socket is not None:
+            server = await asyncio.start_unix_server(self._handle, unix_socket)
+        else:
+            server = await asyncio.start_server(self._handle, host, port)
+        self._servers.append(server)
+        return server
+
+    def _new_executor(self):
+        # the workers are not forked from the server: a worker forked while a connection is open would inherit its
+        # socket and keep the connection open after the server closed it
+        context = multiprocessing.get_context("forkserver") \
+            if "forkserver" in multiprocessing.get_all_start_methods() else None
+        return concurrent.futures.ProcessPoolExecutor(max_workers=1, mp_context=context, initializer=_start_worker,
+                                                      initargs=(self.cache_size, self.cache_directory))
+
+    async def _run(self, worker, request):
+        # solves request in the process of worker, which is replaced (with an empty cache) if it died
+        loop = asyncio.get_running_loop()
+        for attempt in range(2):
+            executor = self._executors[worker]
+            try:
+                return await loop.run_in_executor(executor, solve_request, request)
+            except concurrent.futures.process.BrokenProcessPool:
+                if self._executors[worker] is executor:  # not replaced yet by another request of this worker
+                    executor.shutdown(wait=False)
+                    self._executors[worker] = self._new_executor()
+                    self.counters["restarted_workers"] += 1
+        raise WorkerDied("The worker process died while solving the request, it was restarted.")
+
+    async def close(self):
+        """Stops listening and shuts the worker processes down."""
+        for server in self._servers:
+            server.close()
+            await server.wait_closed()
+        self._servers.clear()
+        for executor in self._executors:
+            executor.shutdown(wait=True)
+        self._executors.clear()
+
+    async def solve(self, request):
+        """Returns the answer to a /solve request (a dictionary). An identical request already in flight is not
+        solved again, its answer is shared."""
+        check_request(request)
+        key = hashlib.sha1(json.dumps(request, sort_keys=True).encode()).hexdigest()
+        future = self._in_flight.get(key)
+        if future is not None:
+            self.counters["coalesced"] += 1
+            return dict(await asyncio.shield(future), coalesced=True)
+        worker = int(geometry_key(request), 16) % len(self._executors)
+        future = asyncio.ensure_future(self._run(worker, request))
+        self._in_flight[key] = future
+        future.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        answer = await asyncio.shield(future)  # a closed connection does not cancel a solve shared with others
+        self.counters["solved"] += 1
+        return dict(answer, coalesced=False)
+
+    def health(self):
+        return dict(self.counters, status="ok", workers=self.workers, in_flight=len(self._in_flight))
+
+    async def _answer(self, reader):
+        # reads an HTTP request and returns (status, answer)
+        request_line = (await reader.readline()).decode("latin-1").split()
+        headers = dict()
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        if len(request_line) < 2:
+            return 400, {"error": "Malformed request."}
+        method, path = request_line[0], request_line[1].split("?")[0]
+        if path == "/health":
+            return (200, self.health()) if method == "GET" else (405, {"error": "Use GET."})
+        if path != "/solve":
+            return 404, {"error": "Unknown path {}, use /solve or /health.".format(path)}
+        if method != "POST":
+            return 405, {"error": "Use POST."}
+        try:
+            length = int(headers.get("content-length", 0))
+            if length < 0:
+                raise ValueError("Negative Content-Length.")
+            if length > self.max_body:
+                return 413, {"error": "The request is larger than {} bytes.".format(self.max_body)}
+            request = json.loads(await reader.readexactly(length))
+            return 200, await self.solve(request)
+        except (ValueError, KeyError, TypeError, FileExistsError) as error:
+            # bad Content-Length, bad JSON, bad csv, unknown fields or parameters
+            return 400, {"error": "{}: {}".format(type(error).__name__, error)}
+        except WorkerDied as error:
+            return 503, {"error": str(error)}
+
+    async def _handle(self, reader, writer):
+        self.counters["requests"] += 1
+        try:
+            status, answer = await self._answer(reader)
+        except Exception as error:
+            status, answer = 500, {"error": "{}: {}".format(type(error).__name__, error)}
+        if status != 200:
+            self.counters["errors"] += 1
+        body = json.dumps(answer).encode()
+        writer.write("HTTP/1.1 {} {}\r\nContent-Type: application/json\r\nContent-Length: {}\r\n"
+                     "Connection: close\r\n\r\n".format(status, REASONS[status], len(body)).encode("latin-1") + body)
+        try:
+            await writer.drain()
+            writer.close()
+            await writer.wait_closed()
+        except ConnectionError:  # the client went away
+            pass
+
+
+async def serve(host="127.0.0.1", port=8765, unix_socket=None, **kwargs):
+    """Runs a SolveServer (kwargs are passed to it) until it is interrupted."""
+    solve_server = SolveServer(**kwargs)
+    server = await solve_server.start(host, port, unix_socket)
+    print("Solve server listening on {} with {} workers".format(unix_socket or "{}:{}".format(host, port),
+                                                                solve_server.workers), flush=True)
+    try:
+        await server.serve_forever()
+    finally:
+        await solve_server.close()
+
+
+def main(arguments=None):
+    parser = argparse.ArgumentParser(description="Local Clarke and Wright solve server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix-socket", help="listen on this Unix socket instead of host:port")
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--cache-size", type=int, default=16, help="matrices kept in memory by every worker")
+    parser.add_argument("--cache-directory", help="directory where the workers share their matrices")
+    arguments = parser.parse_args(arguments)
+    try:
+        asyncio.run(serve(arguments.host, arguments.port, arguments.unix_socket, workers=arguments.workers,
+                          cache_size=arguments.cache_size, cache_directory=arguments.cache_directory))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""Implements a spatial index over the positions of the clients, used to find the nearest neighbours of every client
+without computing the distances between all the pairs of clients. It gives exact results.
+
+KDTreeIndex splits the points recursively at the median of their widest coordinate until the leaves hold at most
+leaf_size points, so its leaves follow the density of the points: it suits evenly spread points as well as clustered
+points (dense cities and sparse rural clients). The distances are computed between the points of a leaf and their
+candidates, so that the memory used grows linearly with the number of points.
+"""
+import heapq
+import numpy as np
+
+
+class KDTreeIndex:
+
+    def __init__(self, x, y, leaf_size=32):
+        """x, y: coordinates of the points (1-dimensional arrays).
+        leaf_size: maximum number of points of a leaf of the tree."""
+        self.x = np.asarray(x, dtype=float)
+        self.y = np.asarray(y, dtype=float)
+        self.leaf_size = max(int(leaf_size), 1)
+        self.order = np.arange(len(self.x))  # points sorted by leaf: node i holds order[lows[i]:highs[i]]
+        self.lows, self.highs, self.children, self.boxes = [], [], [], []  # boxes: (x_min, x_max, y_min, y_max)
+        if len(self.x):
+            self._build()
+        self.boxes = np.array(self.boxes, dtype=float).reshape(-1, 4)
+
+    def __len__(self):
+        return len(self.x)
+
+    def __repr__(self):
+        return "<KDTreeIndex at {}. {} points, {} nodes, leaves of {} points at most>".format(
+            hex(id(self)), len(self), len(self.lows), self.leaf_size)
+
+    def _add_node(self, low, high):
+        points = self.order[low:high]
+        x, y = self.x[points], self.y[points]
+        self.lows.append(low)
+        self.highs.append(high)
+        self.children.append(None)
+        self.boxes.append((x.min(), x.max(), y.min(), y.max()))
+        return len(self.lows) - 1
+
+    def _build(self):
+        stack = [self._add_node(0, len(self.x))]
+        while stack:
+            node = stack.pop()
+            low, high = self.lows[node], self.highs[node]
+            if high - low <= self.leaf_size:
+                continue
+            x_min, x_max, y_min, y_max = self.boxes[node]
+            coordinates = self.x if x_max - x_min >= y_max - y_min else self.y  # split along the widest side
+            points = self.order[low:high]
+            middle = (high - low) // 2
+            self.order[low:high] = points[np.argpartition(coordinates[points], middle)]
+            self.children[node] = (self._add_node(low, low + middle), self._add_node(low + middle, high))
+            stack.extend(self.children[node])
+
+    def _box_distances(self, box, nodes):
+        # lower bound of the distance between a point of box and a point of each node
+        boxes = self.boxes[nodes]
+        dx = np.maximum(0., np.maximum(boxes[:, 0] - box[1], box[0] - boxes[:, 1]))
+        dy = np.maximum(0., np.maximum(boxes[:, 2] - box[3], box[2] - boxes[:, 3]))
+        return np.hypot(dx, dy)
+
+    def k_nearest(self, k, radius=None):
+        """Returns (neighbours, distances), two (number of points, k) arrays: row i holds the indices of the k points
+        nearest to point i (point i excluded) sorted by distance, and their distances. If radius is given, only the
+        points at a distance lower than or equal to radius are neighbours. Missing neighbours have index -1 and
+        distance inf.
+        The nodes of the tree are visited in increasing order of their distance to a leaf, until k other points were
+        found for all its points, then every node that can still hold a closer point is visited too."""
+        nb_points = len(self)
+        k = max(min(k, nb_points - 1), 0)
+        neighbours = np.full((nb_points, k), -1, dtype=np.int64)
+        distances = np.full((nb_points, k), np.inf)
+        if k == 0:
+            return neighbours, distances
+        for leaf in [node for node, children in enumerate(self.children) if children is None]:
+            members = self.order[self.lows[leaf]:self.highs[leaf]]
+            box = self.boxes[leaf]
+            heap = [(0., 0)]  # (distance, node), from the root
+            found = []  # leaves visited
+            nb_found = 0
+            bound = np.inf
+            while heap and heap[0][0] <= bound:
+                _, node = heapq.heappop(heap)
+                children = self.children[node]
+                if children is None:
+                    found.append(self.order[self.lows[node]:self.highs[node]])
+                    nb_found += self.highs[node] - self.lows[node]
+                    if bound == np.inf and nb_found > k:
+                        # every point has k candidates: none of its neighbours is farther than its k-th candidate
+                        candidates = np.concatenate(found)
+                        d = self._distances(members, candidates, radius)
+                        bound = np.partition(d, k - 1, axis=1)[:, k - 1].max()
+                        if radius is not None:
+                            bound = min(bound, radius)
+                else:
+                    for child, distance in zip(children, self._box_distances(box, list(children)).tolist()):
+                        heapq.heappush(heap, (distance, child))
+            candidates = np.concatenate(found)
+            d = self._distances(members, candidates, radius)
+            nb_found = min(k, len(candidates))
+            nearest = np.argpartition(d, nb_found - 1, axis=1)[:, :nb_found]
+            nearest_d = np.take_along_axis(d, nearest, axis=1)
+            sort = np.argsort(nearest_d, axis=1, kind="stable")
+            nearest = np.take_along_axis(nearest, sort, axis=1)
+            nearest_d = np.take_along_axis(nearest_d, sort, axis=1)
+            neighbours[members, :nb_found] = np.where(np.isfinite(nearest_d), candidates[nearest], -1)
+            distances[members, :nb_found] = nearest_d
+        return neighbours, distances
+
+    def _distances(self, members, candidates, radius):
+        d = np.hypot(self.x[members, None] - self.x[candidates], self.y[members, None] - self.y[candidates])
+        d[members[:, None] == candidates[None, :]] = np.inf
+        if radius is not None:
+            d[d > radius] = np.inf
+        return d
@@ -1,12 +1,23 @@
-"""Implements a few functions to help visualise problems and theirs solutions."""
+"""Implements a few functions to help visualise problems and theirs solutions.
+
+With the keyword argument fast=True, the plots scale to thousands of clients and routes: the clients are drawn as one
+scatter (optionally decimated to max_points points), the deliveries of a solution as one LineCollection, and the
+demands are only written when at most label_threshold clients are in view (they appear when zooming in).
+render_to_file draws a problem and its solutions in fast mode with the Agg backend, without a display.
+"""
 import numpy as np
 import matplotlib.pyplot as plt  # very powerful module when it comes to plotting things
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.collections import LineCollection
+from matplotlib.figure import Figure
+import Drone as dro
 
 
 
 def plot_problem(problem, ax=None, **kwargs): 
     """This function creates a plot representing the problem to solve. It plots the depot and the clients (and the
-    clients' demand if plot_demand is True).
+    clients' demand if plot_demand is True). See the module docstring for the fast mode (keyword arguments fast,
+    max_points and label_threshold).
     """
     if ax is None: 
         fig = plt.figure()  
@@ -19,56 +30,95 @@ def plot_problem(problem, ax=None, **kwargs):
 
     x_depot = [problem.depot.x]
     y_depot = [problem.depot.y]
-    x_clients = []
-    y_clients = []
-    for client in problem.clients_list:
-        x_clients.append(client.x)
-        y_clients.append(client.y)
-    # return x_depot, y_depot, x_clients, y_clients
+    x_clients = problem.x
+    y_clients = problem.y
     ax.plot(x_depot, y_depot, marker="s", color="red", label="Depot", linestyle="None", ms=7, zorder=2)
+    if kwargs.get("fast", False):
+        max_points = kwargs.get("max_points")
+        step = 1 if not max_points else max(1, -(-len(x_clients) // max_points))  # keeps one client out of step
+        ax.scatter(x_clients[::step], y_clients[::step], s=9, marker="o", color="blue", label="Clients (demand)",
+                   zorder=1)
+        if kwargs.get("plot_demand", True):
+            _demand_labels(ax, x_clients, y_clients, problem.demand, kwargs.get("label_threshold", 100),
+                           kwargs.get("demand_size", 16))
+        return ax
     ax.plot(x_clients, y_clients, marker="o", color="blue", label="Clients (demand)", linestyle="None", ms=3, zorder=1)
     if kwargs.get("plot_demand", True):  
-        for client in problem.clients_list:
-            ax.text(client.x, client.y, str(client.demand), style="italic",
+        for x, y, demand in zip(x_clients.tolist(), y_clients.tolist(), problem.demand.tolist()):
+            ax.text(x, y, str(demand), style="italic",
                     fontsize=kwargs.get("demand_size", 16), color="blue", ha="center", va="bottom", zorder=1)
     # plt.show()
     return ax
 
 
+def _demand_labels(ax, x, y, demand, label_threshold, size):
+    # writes the demands of the clients in view if there are at most label_threshold of them, again at every zoom
+    labels = []
+
+    def update(ax):
+        for label in labels:
+            label.remove()
+        labels.clear()
+        (x_min, x_max), (y_min, y_max) = sorted(ax.get_xlim()), sorted(ax.get_ylim())
+        in_view = np.flatnonzero((x >= x_min) & (x <= x_max) & (y >= y_min) & (y <= y_max))
+        if len(in_view) <= label_threshold:
+            labels.extend(ax.text(x_i, y_i, str(demand_i), style="italic", fontsize=size, color="blue", ha="center",
+                                  va="bottom", zorder=1)
+                          for x_i, y_i, demand_i in zip(x[in_view].tolist(), y[in_view].tolist(),
+                                                        demand[in_view].tolist()))
+
+    update(ax)
+    ax.callbacks.connect("xlim_changed", update)
+    ax.callbacks.connect("ylim_changed", update)
+
+
 def plot_solution(solution, ax, color, **kwargs):
     """This function plots a solution. More precisely, it plots all the deliveries of the solution on the axis 'ax' with
-    the color 'color'.
+    the color 'color'. With fast=True, the deliveries are drawn as one LineCollection.
     """
     # setting up a dashed pattern. It represents a sequence of on/off ink (in points).
     dashes = [np.random.randint(12, 20+1), 2, np.random.randint(4, 6+1), 5]  
     
-    for i, delivery in enumerate(solution.deliveries_list):
-        label = None
-        if i == 0:
-            label = solution.name
-        # Here, you should generate the x_list and y_list variables
-        x_list = [delivery.depot.x]
-        y_list = [delivery.depot.y]
-        for client in delivery.clients_list:
-            x_list.append(client.x)
-            y_list.append(client.y)
-        x_list.append(delivery.depot.x)
-        y_list.append(delivery.depot.y)
-        line, = ax.plot(x_list, y_list, color=color, marker="", linestyle="-", label=label, zorder=0)
-        if kwargs.get('dashed', True):
-            line.set_dashes(dashes)
+    if kwargs.get("fast", False):
+        routes = [np.array([(delivery.depot.x, delivery.depot.y)] +
+                           [(client.x, client.y) for client in delivery.clients_list] +
+                           [(delivery.depot.x, delivery.depot.y)]) for delivery in solution.deliveries_list]
+        linestyle = (0, dashes) if kwargs.get('dashed', True) else "-"
+        ax.add_collection(LineCollection(routes, colors=[color], linestyles=[linestyle], label=solution.name,
+                                         zorder=0))
+        ax.autoscale_view()
+    else:
+        for i, delivery in enumerate(solution.deliveries_list):
+            label = None
+            if i == 0:
+                label = solution.name
+            # Here, you should generate the x_list and y_list variables
+            x_list = [delivery.depot.x]
+            y_list = [delivery.depot.y]
+            for client in delivery.clients_list:
+                x_list.append(client.x)
+                y_list.append(client.y)
+            x_list.append(delivery.depot.x)
+            y_list.append(delivery.depot.y)
+            line, = ax.plot(x_list, y_list, color=color, marker="", linestyle="-", label=label, zorder=0)
+            if kwargs.get('dashed', True):
+                line.set_dashes(dashes)
     ax.legend(loc=0, fontsize='x-small', numpoints=1)
     # Drawing arrows representing the wind
     if kwargs.get('draw_wind', True) and solution.parameters.wind.speed > 0:
         nx = kwargs.get('nx', 10)  
         ny = kwargs.get('ny', 10)  
         rs = kwargs.get('rs', 0.1) 
-        u = np.ones((nx, ny)) * solution.parameters.wind.x
-        v = np.ones((nx, ny)) * solution.parameters.wind.y
         x = np.linspace(*ax.get_xbound(), nx + 2)[1:-1]
         y = np.linspace(*ax.get_ybound(), ny + 2)[1:-1]
-        plt.quiver(x, y, u, v, angles='xy', units='dots', scale=rs,
-                   width=2, headwidth=2, headlength=3.5, facecolor=color, edgecolor=color, zorder=-1, alpha=0.4)
+        if isinstance(solution.parameters.wind, dro.WindField):
+            x, y = np.meshgrid(x, y)
+            u, v = solution.parameters.wind.at(x, y)
+        else:
+            u = np.ones((nx, ny)) * solution.parameters.wind.x
+            v = np.ones((nx, ny)) * solution.parameters.wind.y
+        ax.quiver(x, y, u, v, angles='xy', units='dots', scale=rs,
+                  width=2, headwidth=2, headlength=3.5, facecolor=color, edgecolor=color, zorder=-1, alpha=0.4)
     return ax
 
 
@@ -95,7 +145,7 @@ def plot_problem_solutions(problem, **kwargs):
     """
     
     colors_list = [np.array([1., 1., 1.])] 
-    ax = kwargs.get('ax')
+    ax = kwargs.pop('ax', None)
     if ax is None:
         fig = plt.figure()
         ax = fig.add_subplot(111)
@@ -108,3 +158,16 @@ def plot_problem_solutions(problem, **kwargs):
     for solution in problem.solutions_list:
         ax = plot_solution(solution, ax, get_random_color(colors_list, **kwargs), **kwargs)
     return ax
+
+
+def render_to_file(problem, file_name, figsize=(12, 8), dpi=100, **kwargs):
+    """Plots problem and its solutions in fast mode (see the module docstring) on a figure rendered by the Agg backend,
+    without pyplot and without a display, and saves it to file_name (the format is given by its extension).
+    The keyword arguments are passed to plot_problem_solutions."""
+    fig = Figure(figsize=figsize, dpi=dpi)
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot(111)
+    kwargs.setdefault("fast", True)
+    plot_problem_solutions(problem, ax=ax, **kwargs)
+    fig.savefig(file_name)
+    return fig
@@ -0,0 +1,124 @@
+"""Re-solves a problem when its parameters change (typically a new wind forecast), starting from the previous solution
+instead of from scratch.
+
+The cost matrix is computed for the new parameters in one vectorized pass. A link of a previous route (client a
+followed by client b) is kept if its saving is still positive and if b did not lose more than rank_tolerance places
+in the ranking of the possible successors of a by savings. The previous routes are cut at the other links, and the
+routes that the new drone can not carry are cut at every link. The fragments are then merged with the parallel Clarke
+and Wright algorithm, which only needs the savings between the last clients and the first clients of the fragments
+instead of the sorted savings of all the pairs of clients.
+"""
+import time
+import numpy as np
+import Drone as dro
+import CostFunction as cost
+
+
+def solution_routes(problem, solution):
+    """Returns the routes of solution as lists of indices of clients in problem.clients_list."""
+    index_of = None
+    routes = []
+    for delivery in solution.deliveries_list:
+        if delivery.route.indices is not None:
+            routes.append([int(i) for i in delivery.route.indices])
+        else:
+            if index_of is None:
+                index_of = {id(client): i for i, client in enumerate(problem.clients_list)}
+            routes.append([index_of[id(client)] for client in delivery.clients_list])
+    return routes
+
+
+def successor_ranks(problem, parameters, firsts, seconds, c_matrix=None):
+    """Returns (savings, ranks) for the links (firsts[j], seconds[j]) of client indices: the saving of each link and
+    the number of clients that have a greater saving as successors of firsts[j]. The costs are read from c_matrix if
+    it is given, computed for parameters otherwise."""
+    nb_clients = problem.number_of_clients
+    links = np.arange(len(firsts))
+    if c_matrix is not None:
+        to_depot = np.asarray(c_matrix[firsts + 1, 0])
+        from_depot = np.asarray(c_matrix[0, 1:])
+        row_costs = np.asarray(c_matrix[firsts + 1, 1:])
+    else:
+        clients = np.arange(1, nb_clients + 1)
+        to_depot = cost.pair_costs(problem, parameters, firsts + 1, 0)
+        from_depot = cost.pair_costs(problem, parameters, 0, clients)
+        row_costs = cost.pair_costs(problem, parameters, firsts[:, None] + 1, clients[None, :])
+    row_savings = to_depot[:, None] + from_depot[None, :] - row_costs
+    row_savings[links, firsts] = 0.
+    savings = row_savings[links, seconds]
+    return savings, (row_savings > savings[:, None]).sum(axis=1)
+
+
+def warm_start_clarke_and_wright(problem, previous_solution, parameters, rank_tolerance=2, name=None, cache=None):
+    """Solves problem for the new parameters starting from previous_solution, a solution of the same problem (see the
+    module docstring). Creates a solution, appends it to the end of the solutions list of the problem and returns it.
+    The solution has an attribute warm_start_report: a dictionary with the numbers of links of the previous routes,
+    of links kept, of fragments and of pairs of savings used for the merges, and the duration of the re-solve.
+    cache: optional instance of MatrixCache.MatrixCache where the cost matrix is looked up."""
+    start = time.perf_counter()
+    if name is None:
+        name = "warm started Clarke and Wright. Drone capacity = {}".format(parameters.drone.capacity)
+    if cache is not None:
+        c_matrix = cache.cost_matrix(problem, parameters)
+    else:
+        c_matrix = cost.cost_matrix(problem, parameters)
+    previous_routes = solution_routes(problem, previous_solution)
+
+    # links of the previous routes, ranked with the previous parameters of their delivery and with the new ones
+    firsts = np.array([a for route in previous_routes for a in route[:-1]], dtype=np.int64)
+    seconds = np.array([b for route in previous_routes for b in route[1:]], dtype=np.int64)
+    previous_ranks = np.empty(len(firsts), dtype=np.int64)
+    groups = dict()  # key of (previous parameters, previous cost matrix) -> (parameters, matrix, numbers of the links)
+    link = 0
+    for delivery, route in zip(previous_solution.deliveries_list, previous_routes):
+        matrix = delivery.c_matrix if delivery.uses_cost_matrix else None
+        key = (id(delivery.parameters), id(matrix))
+        groups.setdefault(key, (delivery.parameters, matrix, []))[2].extend(range(link, link + len(route) - 1))
+        link += max(len(route) - 1, 0)
+    for previous_parameters, matrix, numbers in groups.values():
+        if numbers:
+            _, previous_ranks[numbers] = successor_ranks(problem, previous_parameters, firsts[numbers],
+                                                         seconds[numbers], matrix)
+    new_savings, new_ranks = successor_ranks(problem, parameters, firsts, seconds, c_matrix)
+    keep = (new_savings > 0) & (new_ranks <= previous_ranks + rank_tolerance)
+
+    # fragments of the previous routes, then the clients that were not delivered
+    demands = problem.demand.tolist()
+    capacity = parameters.drone.capacity
+    fragments = []
+    link = 0
+    for route in previous_routes:
+        if not route:
+            continue
+        # a route that the new drone can not carry is dissolved: all its clients are merged again
+        legal = sum(demands[client] for client in route) <= capacity
+        fragment = [route[0]]
+        for client in route[1:]:
+            if legal and keep[link]:
+                fragment.append(client)
+            else:
+                fragments.append(fragment)
+                fragment = [client]
+            link += 1
+        fragments.append(fragment)
+    routed = np.zeros(problem.number_of_clients, dtype=bool)
+    for fragment in fragments:
+        routed[fragment] = True
+    fragments.extend([i] for i in np.flatnonzero(~routed).tolist())
+
+    # savings of the merges of a fragment (by its last client) with another one (by its first client)
+    tails = np.array([fragment[-1] for fragment in fragments], dtype=np.int64)
+    heads = np.array([fragment[0] for fragment in fragments], dtype=np.int64)
+    s_matrix = c_matrix[tails + 1, :1] + c_matrix[:1, heads + 1] - c_matrix[np.ix_(tails + 1, heads + 1)]
+    s_matrix[tails[:, None] == heads[None, :]] = 0.
+    sorted_savings, pairs = cost.positive_savings_pairs(s_matrix)
+    client_pairs = np.stack((tails[pairs[:, 0]], heads[pairs[:, 1]]), axis=1).astype(np.int32)
+    deliveries_list = cost.parallel_build_deliveries(problem, parameters, sorted_savings, client_pairs, c_matrix,
+                                                     initial_routes=fragments)
+
+    solution = dro.Solution(name, deliveries_list, parameters)
+    solution.warm_start_report = {"links": len(firsts), "kept_links": sum(len(fragment) - 1 for fragment in fragments),
+                                  "fragments": len(fragments), "pairs": len(sorted_savings),
+                                  "time": time.perf_counter() - start}
+    problem.solutions_list.append(solution)
+    return solution